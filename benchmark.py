@@ -0,0 +1,251 @@
+# benchmark.py
+# ブラウザなしで各ページのデータ処理（クエリ・集計・グラフ描画・PowerPoint生成）の時間を計測する
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List
+
+from database import Database
+from periods import ALL_PERIOD, PERIOD_THIS_QUARTER, period_for
+
+TAGS = ["プロダクト開発", "受託開発", "公的開発", "保守運用", "コンサルティング"]
+SG_A_CATEGORIES = ["役員報酬", "給与手当", "地代家賃", "広告宣伝費", "旅費交通費", "通信費", "支払手数料"]
+INSERT_BATCH_SIZE = 50000
+BENCH_OWNER = "bench"  # 架空データの所有ユーザー
+# 同時に書き込むセッション数と、1セッションあたりの書き込み回数（月末の一斉登録を想定）
+CONCURRENT_WRITERS = 8
+WRITES_PER_WRITER = 25
+
+
+def _random_dates(rng: random.Random, start: date, days: int, count: int) -> List[str]:
+    return [(start + timedelta(days=rng.randrange(days))).isoformat() for _ in range(count)]
+
+
+def generate_data(rows: int, years: int = 5, projects: int = 500, seed: int = 0,
+                  owner: str = BENCH_OWNER) -> Dict[str, int]:
+    """現在のDatabase.DB_FILEにownerの架空の売上・原価・販管費・資金データを投入する
+
+    rowsは売上の件数。原価はその1/2、販管費は1/4、資金は期間の月数分を作る。
+    """
+    rng = random.Random(seed)
+    start = date.today().replace(day=1) - timedelta(days=365 * years)
+    days = 365 * years
+    project_names = [f"PJ{i:05d}" for i in range(projects)]
+
+    existing_tags = {row[0] for row in Database.fetch_data("SELECT tag_name FROM tags WHERE owner = ?", (owner,))}
+    Database.execute_many(
+        "INSERT INTO tags (owner, tag_name) VALUES (?, ?)", [(owner, tag) for tag in TAGS if tag not in existing_tags]
+    )
+    tag_ids = [row[0] for row in Database.fetch_data(
+        f"SELECT MIN(id) FROM tags WHERE owner = ? AND tag_name IN ({', '.join('?' for _ in TAGS)}) GROUP BY tag_name",
+        (owner, *TAGS)
+    )]
+    if not Database.fetch_data("SELECT 1 FROM target_revenue WHERE owner = ?", (owner,)):
+        Database.execute_query("INSERT INTO target_revenue (owner, amount) VALUES (?, ?)", (owner, rows * 500 * 1000))
+
+    counts = {"sales": rows, "costs": rows // 2, "sg_a_costs": rows // 4}
+    for table, count in counts.items():
+        for offset in range(0, count, INSERT_BATCH_SIZE):
+            size = min(INSERT_BATCH_SIZE, count - offset)
+            dates = _random_dates(rng, start, days, size)
+            if table == "sales":
+                Database.execute_many(
+                    "INSERT INTO sales (owner, project, tag_id, revenue, date) VALUES (?, ?, ?, ?, ?)",
+                    [(owner, rng.choice(project_names), rng.choice(tag_ids), rng.randint(100, 5000) * 1000, d) for d in dates]
+                )
+            elif table == "costs":
+                Database.execute_many(
+                    "INSERT INTO costs (owner, project, cost, date) VALUES (?, ?, ?, ?)",
+                    [(owner, rng.choice(project_names), rng.randint(10, 3000) * 1000, d) for d in dates]
+                )
+            else:
+                Database.execute_many(
+                    "INSERT INTO sg_a_costs (owner, category, amount, date) VALUES (?, ?, ?, ?)",
+                    [(owner, rng.choice(SG_A_CATEGORIES), rng.randint(10, 1000) * 1000, d) for d in dates]
+                )
+
+    months = sorted({(start + timedelta(days=d)).strftime("%Y-%m") for d in range(0, days, 28)})
+    Database.execute_many(
+        "INSERT INTO cashflow (owner, month, inflow, outflow) VALUES (?, ?, ?, ?)",
+        [(owner, m, rng.randint(5000, 20000) * 1000, rng.randint(4000, 18000) * 1000) for m in months]
+    )
+    counts["cashflow"] = len(months)
+    return counts
+
+
+def _time(func: Callable, repeat: int, setup: Callable = None) -> Dict[str, float]:
+    """funcをrepeat回実行し、秒単位の最小・中央値・最大を返す（setupは毎回の前処理で計測しない）"""
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return {"min": min(samples), "median": statistics.median(samples), "max": max(samples)}
+
+
+def _concurrent_writes(owner: str) -> None:
+    """複数のセッションが同時にフォームから登録する状況（データは変えない更新を書き込みスレッドに送る）"""
+    def session():
+        for _ in range(WRITES_PER_WRITER):
+            Database.execute_query("UPDATE target_revenue SET amount = amount WHERE owner = ?", (owner,))
+
+    with ThreadPoolExecutor(max_workers=CONCURRENT_WRITERS) as executor:
+        for future in [executor.submit(session) for _ in range(CONCURRENT_WRITERS)]:
+            future.result()
+
+
+def _cold_query_cache():
+    Database.bump_generation()
+
+
+def _cold_caches():
+    import charts
+    Database.bump_generation()
+    charts.chart_cache.clear()
+
+
+def run_benchmarks(repeat: int = 3, render: bool = True, owner: str = BENCH_OWNER) -> Dict[str, Dict[str, float]]:
+    """ownerのデータでページごとの処理を計測する（クエリ結果・グラフのキャッシュは毎回空にする）"""
+    import cashflow_forecast
+    import forecasting
+    import frames
+    import queries
+    import report_sections
+    from reports import EXPORT_NATIVE, EXPORT_IMAGE, new_presentation, add_slides, presentation_to_bytes
+
+    def export(section, mode):
+        ppt = new_presentation()
+        add_slides(ppt, section(owner, ALL_PERIOD, mode))
+        return presentation_to_bytes(ppt)
+
+    quarter = period_for(PERIOD_THIS_QUARTER)
+    sales_batch = {
+        "target": lambda: queries.target_revenue(owner),
+        "total": lambda: queries.sales_total(owner, ALL_PERIOD),
+        "monthly": lambda: queries.sales_by_month(owner, ALL_PERIOD),
+        "by_tag": lambda: queries.sales_by_tag(owner, ALL_PERIOD),
+    }
+    stages = {
+        # ホーム（主要指標を1回のクエリで）
+        "home.kpi": lambda: queries.kpi_summary(owner, ALL_PERIOD),
+        # 売上管理ページ
+        "sales.queries": lambda: (
+            queries.target_revenue(owner), queries.sales_total(owner, ALL_PERIOD),
+            queries.sales_by_month(owner, ALL_PERIOD), queries.sales_by_tag(owner, ALL_PERIOD)
+        ),
+        # 同じ集計を1つの読み取りトランザクションで／スレッドプールで並行に
+        "sales.queries_batch": lambda: Database.fetch_batch(sales_batch),
+        "sales.queries_batch_parallel": lambda: Database.fetch_batch(sales_batch, parallel=True),
+        # サイドバーで今四半期を選んだ場合（索引で範囲検索）
+        "sales.queries_this_quarter": lambda: (
+            queries.sales_total(owner, quarter), queries.sales_by_month(owner, quarter),
+            queries.sales_by_tag(owner, quarter)
+        ),
+        "sales.grid_page": lambda: queries.sales_page(owner, ALL_PERIOD, limit=queries.SALES_PAGE_SIZE + 1),
+        "sales.search": lambda: queries.search_sales(owner, ALL_PERIOD, "PJ001"),
+        "sales.export_native": lambda: export(report_sections.sales_section, EXPORT_NATIVE),
+        # 原価・販管費・資金管理ページ
+        "costs.queries": lambda: queries.cost_by_project(owner, ALL_PERIOD),
+        # 原価管理ページの明細（型付きのDataFrameにしてから案件別に集計）
+        "costs.frame": lambda: frames.load_frame(
+            "SELECT project, cost, date FROM costs WHERE owner = ? AND date BETWEEN ? AND ?",
+            (owner, ALL_PERIOD.start, ALL_PERIOD.end),
+            [("案件名", frames.CATEGORY), ("原価金額", frames.INTEGER), ("日付", frames.DATE)]
+        ).groupby("案件名", observed=True)["原価金額"].sum(),
+        "sg_a_costs.queries": lambda: queries.sg_a_costs_by_category(owner, ALL_PERIOD),
+        "cashflow.queries": lambda: queries.cashflow_by_month(owner, ALL_PERIOD),
+        "cashflow.position_and_forecast": lambda: (
+            queries.cash_position(owner, ALL_PERIOD), cashflow_forecast.cash_forecast(owner)
+        ),
+        # 利益管理ページ
+        "profit.queries": lambda: (
+            queries.profit_totals(owner, ALL_PERIOD), queries.profit_by_month(owner, ALL_PERIOD)
+        ),
+        "profit.forecast": lambda: (
+            forecasting.profit_forecast(owner), forecasting.sales_forecast(owner, "project"),
+            forecasting.sales_forecast(owner, "tag")
+        ),
+        "profit.export_native": lambda: export(report_sections.profit_section, EXPORT_NATIVE),
+        # 同時書き込み（書き込みスレッドでまとめてコミット）
+        "writes.concurrent_sessions": lambda: _concurrent_writes(owner),
+    }
+    if render:
+        stages.update({
+            "sales.charts_and_export_image": lambda: export(report_sections.sales_section, EXPORT_IMAGE),
+            "profit.charts_and_export_image": lambda: export(report_sections.profit_section, EXPORT_IMAGE),
+        })
+
+    results = {}
+    for name, func in stages.items():
+        setup = _cold_caches if "image" in name else _cold_query_cache
+        results[name] = _time(func, repeat, setup)
+        print(f"{name:36s} median {results[name]['median'] * 1000:10.2f} ms")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="経営ダッシュボードのベンチマーク")
+    parser.add_argument("--rows", type=int, default=10000, help="売上データの件数（1,000〜10,000,000）")
+    parser.add_argument("--years", type=int, default=5, help="データの期間（年）")
+    parser.add_argument("--projects", type=int, default=500, help="案件数")
+    parser.add_argument("--repeat", type=int, default=3, help="各処理の計測回数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--source", default=Database.DB_FILE, help="コピー元のデータベース")
+    parser.add_argument("--no-render", action="store_true", help="Matplotlibのグラフ描画を計測しない")
+    parser.add_argument("--keep-db", action="store_true", help="計測に使ったデータベースを残す")
+    parser.add_argument("--output", default="bench_output.json", help="結果を書き出すJSONファイル")
+    args = parser.parse_args(argv)
+
+    # 元のデータベースは変更せず、一時ディレクトリのコピーに対して計測する
+    workdir = tempfile.mkdtemp(prefix="dashboard_bench_")
+    scratch_db = os.path.join(workdir, "dashboard_data.db")
+    if os.path.exists(args.source):
+        with sqlite3.connect(args.source) as source, sqlite3.connect(scratch_db) as target:
+            source.backup(target)
+    Database.DB_FILE = scratch_db
+    try:
+        Database.init_db()
+        started = time.perf_counter()
+        counts = generate_data(args.rows, args.years, args.projects, args.seed)
+        generate_seconds = time.perf_counter() - started
+        print(f"データ生成: {counts} ({generate_seconds:.1f} 秒)")
+
+        results = run_benchmarks(args.repeat, render=not args.no_render)
+    finally:
+        Database.close_connections()
+        if args.keep_db:
+            print(f"計測用データベース: {scratch_db}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "rows": counts,
+            "repeat": args.repeat,
+            "generate_seconds": generate_seconds,
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"結果を {args.output} に書き出しました")
+    return report
+
+
+if __name__ == "__main__":
+    main()
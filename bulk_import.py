@@ -0,0 +1,160 @@
+# bulk_import.py
+# CSV/Excelファイルからの一括登録（チャンク単位で読み込み、pandasでまとめて検証・変換する）
+import os
+import sqlite3
+from typing import Dict, List, NamedTuple, Tuple
+
+import pandas as pd
+import streamlit as st
+from database import Database
+from money import THOUSAND_YEN, YEN, to_yen
+from periods import normalize_month
+
+CHUNK_SIZE = 10000
+
+# テーブルごとの取り込み列（DB列名, ファイルの見出し, 種別）
+# 種別: text=必須文字列, optional_text=任意文字列, amount=0以上の金額（円）, thousand_yen=0以上の金額（千円）,
+#       date=日付, month=年月, tag=タグ名（任意。tagsのidに変換し、未登録のタグは登録する）
+IMPORT_SPECS: Dict[str, List[Tuple[str, str, str]]] = {
+    "sales": [("project", "案件名", "text"), ("tag_id", "タグ", "tag"),
+              ("revenue", "売上金額", "thousand_yen"), ("date", "日付", "date")],
+    "costs": [("project", "案件名", "text"), ("cost", "原価金額", "amount"), ("date", "日付", "date")],
+    "sg_a_costs": [("category", "費目", "text"), ("amount", "金額", "amount"), ("date", "日付", "date")],
+    "cashflow": [("month", "月", "month"), ("inflow", "収入", "amount"), ("outflow", "支出", "amount")],
+}
+
+
+class ImportResult(NamedTuple):
+    inserted: int
+    errors: List[Tuple[int, str]]  # (ファイル上の行番号, エラー内容)
+
+
+def _read_chunks(file, filename: str):
+    """ファイルをCHUNK_SIZE行ずつのDataFrameとして読み込む（値はすべて文字列のまま）"""
+    if os.path.splitext(filename)[1].lower() in (".xlsx", ".xls"):
+        # Excelはチャンク読み込みできないため、読み込んだ後に分割する
+        df = pd.read_excel(file, dtype=str)
+        for start in range(0, len(df), CHUNK_SIZE):
+            yield df.iloc[start:start + CHUNK_SIZE]
+    else:
+        yield from pd.read_csv(file, dtype=str, chunksize=CHUNK_SIZE, skipinitialspace=True)
+
+
+def _rename_columns(df: pd.DataFrame, spec) -> pd.DataFrame:
+    """見出し（日本語名またはDB列名）をDB列名にそろえる"""
+    mapping = {}
+    for column, label, _ in spec:
+        for name in df.columns:
+            if str(name).strip() in (column, label):
+                mapping[name] = column
+    df = df.rename(columns=mapping)
+    missing = [label for column, label, kind in spec if column not in df.columns and kind not in ("optional_text", "tag")]
+    if missing:
+        raise ValueError(f"必須列がありません: {', '.join(missing)}")
+    return df
+
+
+def _validate_chunk(df: pd.DataFrame, spec) -> Tuple[pd.DataFrame, List[Tuple[int, str]]]:
+    """列ごとにまとめて型変換し、変換できない行をエラーとして除く"""
+    df = _rename_columns(df, spec)
+    clean = pd.DataFrame(index=df.index)
+    invalid = pd.Series(False, index=df.index)
+    errors = []
+    for column, label, kind in spec:
+        raw = df[column] if column in df.columns else pd.Series(None, index=df.index, dtype=object)
+        text = raw.str.strip()
+        if kind in ("text", "optional_text", "tag"):
+            values = text.where(text != "")
+            bad = values.isna() if kind == "text" else pd.Series(False, index=df.index)
+            clean[column] = values.astype(object).where(values.notna(), None)
+        elif kind in ("amount", "thousand_yen"):
+            values = pd.to_numeric(text.str.replace(",", "", regex=False), errors="coerce")
+            bad = values.isna() | (values < 0)
+            # DBには整数の円で保存する（エラー行は後で除くので0で埋めて変換）
+            clean[column] = to_yen(values.fillna(0), THOUSAND_YEN if kind == "thousand_yen" else YEN)
+        elif kind == "month":
+            # 資金管理の入力フォームと同じ書き方（「2023/1」「2023年1月」「202301」など）を受け付ける
+            values = text.map(lambda value: normalize_month(value) if isinstance(value, str) else None)
+            bad = values.isna()
+            clean[column] = values
+        else:
+            values = pd.to_datetime(text.str.replace("/", "-", regex=False), format="ISO8601", errors="coerce")
+            bad = values.isna()
+            clean[column] = values.dt.strftime("%Y-%m-%d")
+        # 行番号は見出し行を1行目として数える
+        errors.extend((int(i) + 2, f"{label}が不正です: {raw[i]!r}") for i in df.index[bad & ~invalid])
+        invalid |= bad
+    return clean[~invalid], errors
+
+
+def _resolve_tags(cursor, owner: str, names: pd.Series, tag_ids: Dict[str, int]) -> pd.Series:
+    """タグ名をtagsのidに変換する（tag_idsは名前→idの対応で、未登録のタグは登録して追加する）"""
+    for name in names.dropna().unique():
+        if name not in tag_ids:
+            cursor.execute("INSERT INTO tags (owner, tag_name) VALUES (?, ?)", (owner, name))
+            tag_ids[name] = cursor.lastrowid
+    return names.map(tag_ids).astype("Int64").astype(object).where(names.notna(), None)
+
+
+def import_file(table: str, file, filename: str, owner: str) -> ImportResult:
+    """ファイルを検証し、正しい行だけを1つのトランザクションで一括登録する（ownerの所有データとして登録）
+
+    取り込み全体を1つのジョブとして書き込みスレッドで実行し、コミットされるまで待つ。
+    """
+    spec = IMPORT_SPECS[table]
+    columns = [column for column, _, _ in spec]
+    query = (f"INSERT INTO {table} (owner, {', '.join(columns)}) "
+             f"VALUES (?, {', '.join('?' for _ in columns)})")
+    tag_columns = [column for column, _, kind in spec if kind == "tag"]
+
+    def job(cursor) -> ImportResult:
+        # ロック競合でやり直されることがあるため、ファイルは毎回先頭から読む
+        file.seek(0)
+        inserted = 0
+        errors: List[Tuple[int, str]] = []
+        tag_ids: Dict[str, int] = {}
+        if tag_columns:
+            cursor.execute("SELECT tag_name, MIN(id) FROM tags WHERE owner = ? GROUP BY tag_name", (owner,))
+            tag_ids.update(cursor.fetchall())
+        for chunk in _read_chunks(file, filename):
+            clean, chunk_errors = _validate_chunk(chunk, spec)
+            errors.extend(chunk_errors)
+            for column in tag_columns:
+                clean[column] = _resolve_tags(cursor, owner, clean[column], tag_ids)
+            if not clean.empty:
+                cursor.executemany(
+                    query, ((owner,) + row for row in clean[columns].itertuples(index=False, name=None))
+                )
+                inserted += len(clean)
+        return ImportResult(inserted, sorted(errors))
+
+    return Database.submit_job(job, table, *(["tags"] if tag_columns else [])).result()
+
+
+def bulk_import_form(table: str):
+    """ページ下部に表示する一括登録フォーム"""
+    spec = IMPORT_SPECS[table]
+    with st.expander("CSV/Excelファイルから一括登録"):
+        st.caption("見出し行: " + ", ".join(label for _, label, _ in spec))
+        uploaded = st.file_uploader("ファイルを選択", type=["csv", "xlsx"], key=f"bulk_import_{table}")
+        if uploaded is not None and st.button("一括登録", key=f"bulk_import_button_{table}"):
+            try:
+                result = import_file(table, uploaded, uploaded.name, st.session_state["username"])
+            except (ValueError, ImportError) as e:
+                st.error(f"ファイルを読み込めませんでした: {e}")
+                return
+            except sqlite3.Error as e:
+                # ロック競合（書き込みスレッドでのやり直し後も解消しない場合）もここで表示する
+                st.error(f"データベースに登録できませんでした（しばらくしてから再度お試しください）: {e}")
+                return
+            st.success(f"{result.inserted:,} 件のデータを登録しました！")
+            if result.errors:
+                st.warning(f"{len(result.errors):,} 件の行はエラーのため登録しませんでした。")
+                error_df = pd.DataFrame(result.errors, columns=["行", "エラー内容"])
+                st.dataframe(error_df, use_container_width=True)
+                st.download_button(
+                    label="エラー一覧をダウンロード",
+                    data=error_df.to_csv(index=False).encode("utf-8-sig"),
+                    file_name=f"{table}_import_errors.csv",
+                    mime="text/csv"
+                )
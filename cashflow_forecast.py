@@ -0,0 +1,61 @@
+# cashflow_forecast.py
+# 資金繰りの見通し（直近の収入・支出の傾向から先の月の残高を見積もる）
+# 計算結果は資金データの世代番号ごとにキャッシュし、データが変わらない限り再計算しない
+from functools import lru_cache
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from database import Database
+from periods import ALL_PERIOD
+from queries import cash_position
+
+FORECAST_MONTHS = 6  # 見通しを出す月数
+TREND_MONTHS = 6  # 傾向を求めるのに使う直近の月数
+
+
+def project_cashflow(months: List[str], inflows, outflows, last_balance: int,
+                     horizon: int = FORECAST_MONTHS,
+                     window: int = TREND_MONTHS) -> List[Tuple[str, int, int, int, int]]:
+    """直近window か月の収入・支出に直線を当てはめ、horizon か月先までの見通しを返す
+
+    収入・支出は2列まとめて最小二乗法で当てはめる（負の値は0にする）。
+    戻り値は cash_position と同じ形（[(月, 収入, 支出, 収支, 残高), ...]）。
+    """
+    if not months or horizon <= 0:
+        return []
+    recent = pd.PeriodIndex(months[-window:], freq="M")
+    x = recent.asi8.astype("float64")
+    y = np.column_stack([np.asarray(inflows[-window:], dtype="float64"),
+                         np.asarray(outflows[-window:], dtype="float64")])
+    future = pd.period_range(recent[-1] + 1, periods=horizon, freq="M")
+
+    # 月の通し番号を中心化してから [1, x] で当てはめる（1か月分だけなら傾きは0になる）
+    center = x.mean()
+    design = np.column_stack([np.ones_like(x), x - center])
+    coefficients, _, _, _ = np.linalg.lstsq(design, y, rcond=None)
+    future_x = future.asi8.astype("float64") - center
+    predicted = np.column_stack([np.ones_like(future_x), future_x]) @ coefficients
+    predicted = np.rint(np.clip(predicted, 0, None)).astype("int64")
+
+    net = predicted[:, 0] - predicted[:, 1]
+    balances = last_balance + np.cumsum(net)
+    return list(zip(future.strftime("%Y-%m"), predicted[:, 0].tolist(), predicted[:, 1].tolist(),
+                    net.tolist(), balances.tolist()))
+
+
+@lru_cache(maxsize=64)
+def _cached_forecast(owner: str, horizon: int, window: int, generation: Tuple[int, ...]):
+    rows = cash_position(owner, ALL_PERIOD)
+    if not rows:
+        return []
+    months, inflows, outflows, _, balances = zip(*rows)
+    return project_cashflow(list(months), inflows, outflows, balances[-1], horizon, window)
+
+
+def cash_forecast(owner: str, horizon: int = FORECAST_MONTHS,
+                  window: int = TREND_MONTHS) -> List[Tuple[str, int, int, int, int]]:
+    """ownerの最新の月に続くhorizon か月の資金見通し（資金データ・期首残高が変わるまでキャッシュ）"""
+    generation = Database.generation("cashflow", "cash_opening_balance")
+    return _cached_forecast(owner, horizon, window, generation)
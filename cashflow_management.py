@@ -3,9 +3,17 @@ import streamlit as st
 import pandas as pd
 import altair as alt
 from database import Database
+from money import to_yen
+from periods import normalize_month
+from queries import cash_opening_balance, cash_position
+from bulk_import import bulk_import_form
+from cashflow_forecast import FORECAST_MONTHS, TREND_MONTHS, cash_forecast
+from instrumentation import stage
 
 def cashflow_management_page():
     st.header("資金管理")
+    owner = st.session_state["username"]
+    period = st.session_state["period"]
 
     # 資金データ登録フォーム
     with st.form("cashflow_form"):
@@ -14,19 +22,60 @@ def cashflow_management_page():
         outflow = st.number_input("支出（円）", min_value=0, step=1000)
         submitted = st.form_submit_button("登録")
         if submitted:
+            # 期間で範囲検索できるよう、月はYYYY-MMにそろえて保存する
+            normalized_month = normalize_month(month)
+            if normalized_month is None:
+                st.error("月は「2023-01」の形式で入力してください。")
+            else:
+                Database.execute_query(
+                    "INSERT INTO cashflow (owner, month, inflow, outflow) VALUES (?, ?, ?, ?)",
+                    (owner, normalized_month, to_yen(inflow), to_yen(outflow))
+                )
+                st.success("資金データを登録しました！")
+
+    # CSV/Excelからの一括登録
+    bulk_import_form("cashflow")
+
+    # 期首残高（資金データの最初の月より前の残高）
+    with st.form("cash_opening_balance_form"):
+        opening_balance = st.number_input(
+            "期首残高（円）", value=cash_opening_balance(owner), step=1000
+        )
+        if st.form_submit_button("期首残高を登録"):
             Database.execute_query(
-                "INSERT INTO cashflow (month, inflow, outflow) VALUES (?, ?, ?)",
-                (month, inflow, outflow)
+                "INSERT INTO cash_opening_balance (owner, amount) VALUES (?, ?) "
+                "ON CONFLICT (owner) DO UPDATE SET amount = excluded.amount",
+                (owner, to_yen(opening_balance))
             )
-            st.success("資金データを登録しました！")
+            st.success("期首残高を登録しました！")
 
-    # 資金データ表示
-    data = Database.fetch_data("SELECT month, inflow, outflow FROM cashflow")
-    df = pd.DataFrame(data, columns=["月", "収入", "支出"])
+    # 月別の資金残高（残高はSQLのウィンドウ関数で累計）
+    with stage("cashflow", "load"):
+        data = cash_position(owner, period)
+        df = pd.DataFrame(data, columns=["月", "収入", "支出", "収支", "残高"])
     if not df.empty:
-        st.dataframe(df)
+        st.dataframe(df, hide_index=True)
         total_inflow = df["収入"].sum()
         total_outflow = df["支出"].sum()
         st.metric("収入合計", f"{total_inflow:,} 円")
         st.metric("支出合計", f"{total_outflow:,} 円")
         st.metric("収支", f"{total_inflow - total_outflow:,} 円")
+        st.metric("期末残高", f"{df['残高'].iloc[-1]:,} 円")
+
+    # 残高の推移と見通し（直近の収入・支出の傾向から）
+    horizon = st.slider("見通しの月数", min_value=1, max_value=24, value=FORECAST_MONTHS, key="cash_forecast_months")
+    with stage("cashflow", "forecast"):
+        forecast = pd.DataFrame(cash_forecast(owner, horizon), columns=["月", "収入", "支出", "収支", "残高"])
+    if not forecast.empty:
+        history = df.assign(種別="実績")
+        chart_data = pd.concat([history, forecast.assign(種別="見通し")], ignore_index=True)
+        chart = alt.Chart(chart_data).mark_line(point=True).encode(
+            x="月:O",
+            y="残高:Q",
+            color="種別:N",
+            strokeDash="種別:N",
+            tooltip=["月", "収入", "支出", "残高", "種別"]
+        )
+        st.altair_chart(chart, use_container_width=True)
+        st.caption(f"見通しは直近{TREND_MONTHS}か月の収入・支出の傾向から計算しています。")
+        st.dataframe(forecast, hide_index=True)
@@ -0,0 +1,244 @@
+# charts.py
+# Matplotlibのグラフ描画と、描画結果（PNG）のキャッシュ
+import hashlib
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional, Sequence
+
+CHART_DPI = 300
+
+_plt = None
+
+
+def _pyplot():
+    """Matplotlib（Aggバックエンド）は最初にグラフを描画するときに読み込む"""
+    global _plt
+    if _plt is None:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+        _plt = plt
+    return _plt
+
+
+class ChartRenderCache:
+    """グラフのデータとパラメータのハッシュをキーにPNGを保持するLRUキャッシュ
+
+    件数・合計バイト数のどちらかが上限を超えると古いものから追い出す。
+    spill_dirを指定すると、追い出したPNGをディスクに退避して再利用する。
+    """
+
+    def __init__(self, max_entries: int = 64, max_bytes: int = 64 * 1024 * 1024,
+                 spill_dir: Optional[str] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            png = self._entries.get(key)
+            if png is not None:
+                self._entries.move_to_end(key)
+                return png
+        png = self._read_spilled(key)
+        if png is not None:
+            self.put(key, png)
+        return png
+
+    def put(self, key: str, png: bytes) -> None:
+        evicted = []
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= len(self._entries.pop(key))
+            self._entries[key] = png
+            self._total_bytes += len(png)
+            while self._entries and (len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes):
+                old_key, old_png = self._entries.popitem(last=False)
+                self._total_bytes -= len(old_png)
+                evicted.append((old_key, old_png))
+        for old_key, old_png in evicted:
+            self._spill(old_key, old_png)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def _spill_path(self, key: str) -> str:
+        return os.path.join(self.spill_dir, f"{key}.png")
+
+    def _spill(self, key: str, png: bytes) -> None:
+        if not self.spill_dir:
+            return
+        path = self._spill_path(key)
+        if not os.path.exists(path):
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(png)
+            os.replace(tmp_path, path)
+
+    def _read_spilled(self, key: str) -> Optional[bytes]:
+        if not self.spill_dir:
+            return None
+        try:
+            with open(self._spill_path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+
+# プロセス内で共有するキャッシュ（CHART_CACHE_DIRを設定するとディスクにも退避する）
+chart_cache = ChartRenderCache(spill_dir=os.environ.get("CHART_CACHE_DIR"))
+
+
+def chart_key(name: str, **params) -> str:
+    """グラフ名・描画データ・パラメータからキャッシュキーを作る"""
+    payload = json.dumps([name, CHART_DPI, params], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def figure_to_png(fig) -> bytes:
+    """MatplotlibのグラフをPNGのバイト列に変換"""
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", dpi=CHART_DPI, bbox_inches="tight")
+    _pyplot().close(fig)
+    return buffer.getvalue()
+
+
+def render_cached(name: str, draw: Callable, **params) -> bytes:
+    """キャッシュにあればそのPNGを返し、なければdraw(**params)で描画して保存する"""
+    key = chart_key(name, **params)
+    png = chart_cache.get(key)
+    if png is None:
+        png = figure_to_png(draw(**params))
+        chart_cache.put(key, png)
+    return png
+
+
+def _draw_sales_bar(target_revenue: int, total_sales: int):
+    plt = _pyplot()
+    fig_bar, ax_bar = plt.subplots(figsize=(8, 6))
+    ax_bar.bar(["目標売上", "総売上"], [target_revenue, total_sales], color=["#FF7F50", "#4682B4"])
+    ax_bar.set_title("目標売上と総売上の比較", fontsize=20, fontweight="bold")
+    ax_bar.set_xlabel("項目", fontsize=14)
+    ax_bar.set_ylabel("売上高（千円）", fontsize=14)
+    for i, v in enumerate([target_revenue, total_sales]):
+        ax_bar.text(i, v + 500, f"{v:,} 千円", ha="center", fontsize=12)
+    return fig_bar
+
+
+def _draw_sales_line(months: Sequence[str], values: Sequence[int]):
+    plt = _pyplot()
+    fig_line, ax_line = plt.subplots(figsize=(8, 6))
+    ax_line.plot(months, values, marker="o", linestyle="-", color="#2E8B57")
+    ax_line.set_title("月別総売上", fontsize=20, fontweight="bold")
+    ax_line.set_xlabel("月次推移", fontsize=14)
+    ax_line.set_ylabel("売上高（千円）", fontsize=14)
+    for x, y in zip(months, values):
+        ax_line.text(x, y + 500, f"{y:,} 千円", fontsize=10, ha="center")
+    return fig_line
+
+
+def _draw_sales_pie(tags: Sequence[str], values: Sequence[int]):
+    plt = _pyplot()
+    fig_pie, ax_pie = plt.subplots(figsize=(6, 6))
+    if sum(values) <= 0:
+        # 売上がない（0だけの）場合は割合を描けない
+        ax_pie.text(0.5, 0.5, "まだデータが登録されていません。", ha="center", va="center", fontsize=14)
+        ax_pie.set_axis_off()
+    else:
+        ax_pie.pie(values, labels=tags, autopct="%1.1f%%", startangle=90, colors=["#FF7F50", "#4682B4", "#32CD32"])
+    ax_pie.set_title("タグごとの売上割合", fontsize=20, fontweight="bold")
+    ax_pie.set_ylabel("")
+    return fig_pie
+
+
+def _draw_profit_monthly(months: Sequence[str], profits: Sequence[int]):
+    plt = _pyplot()
+    fig_monthly, ax_monthly = plt.subplots(figsize=(10, 6))
+
+    # 折れ線グラフを描画
+    line, = ax_monthly.plot(months, profits, marker="o", linestyle="-", color="blue")
+
+    # 凡例を手動で設定
+    ax_monthly.legend([line], ["営業利益"], fontsize=12, loc="upper left", frameon=True, shadow=True)
+
+    # グラフのタイトル、ラベル、凡例を設定
+    ax_monthly.set_title(
+        "月毎利益（単位：千円）",
+        fontsize=20, weight="bold", color="darkblue", pad=20
+    )
+    ax_monthly.set_ylabel(
+        "利益（千円）",
+        fontsize=14, labelpad=10, fontweight="bold", color="black"
+    )
+    ax_monthly.set_xlabel(
+        "月次推移",
+        fontsize=14, labelpad=10, fontweight="bold", color="black"
+    )
+    ax_monthly.tick_params(axis="both", which="major", labelsize=12)
+    ax_monthly.grid(True, linestyle="--", alpha=0.5)
+    return fig_monthly
+
+
+def _draw_category_chart(kind: str, title: str, categories: Sequence[str],
+                         series: dict, ylabel: str):
+    plt = _pyplot()
+    fig, ax = plt.subplots(figsize=(8, 6))
+    if kind == "bar":
+        width = 0.8 / max(len(series), 1)
+        for i, (name, values) in enumerate(series.items()):
+            positions = [x + (i - (len(series) - 1) / 2) * width for x in range(len(categories))]
+            ax.bar(positions, values, width=width, label=name)
+        ax.set_xticks(range(len(categories)))
+        ax.set_xticklabels(categories)
+    else:
+        for name, values in series.items():
+            ax.plot(categories, values, marker="o", linestyle="-", label=name)
+    if len(series) > 1:
+        ax.legend(fontsize=12)
+    ax.set_title(title, fontsize=20, fontweight="bold")
+    ax.set_ylabel(ylabel, fontsize=14)
+    ax.grid(True, axis="y", linestyle="--", alpha=0.5)
+    return fig
+
+
+def category_chart(kind: str, title: str, categories: Sequence[str],
+                   series: dict, ylabel: str) -> bytes:
+    """カテゴリ別の汎用グラフ（kindは"bar"または"line"、seriesは{系列名: 値のリスト}）"""
+    return render_cached("category", _draw_category_chart, kind=kind, title=title,
+                         categories=list(categories),
+                         series={name: [float(v) for v in values] for name, values in series.items()},
+                         ylabel=ylabel)
+
+
+def sales_bar_chart(target_revenue: int, total_sales: int) -> bytes:
+    """目標売上と総売上の比較（棒グラフ）"""
+    return render_cached("sales_bar", _draw_sales_bar,
+                         target_revenue=int(target_revenue), total_sales=int(total_sales))
+
+
+def sales_line_chart(months: Sequence[str], values: Sequence[int]) -> bytes:
+    """月別総売上（折れ線グラフ）"""
+    return render_cached("sales_line", _draw_sales_line,
+                         months=list(months), values=[int(v) for v in values])
+
+
+def sales_pie_chart(tags: Sequence[str], values: Sequence[int]) -> bytes:
+    """タグごとの売上割合（円グラフ）"""
+    return render_cached("sales_pie", _draw_sales_pie,
+                         tags=list(tags), values=[int(v) for v in values])
+
+
+def profit_monthly_chart(months: Sequence[str], profits: Sequence[int]) -> bytes:
+    """月毎利益（折れ線グラフ）"""
+    return render_cached("profit_monthly", _draw_profit_monthly,
+                         months=list(months), profits=[int(v) for v in profits])
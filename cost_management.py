@@ -1,25 +1,25 @@
 # cost_management.py
 import streamlit as st
-import pandas as pd
 import altair as alt
 from database import Database
-from pptx import Presentation
-from pptx.util import Inches
+from money import to_yen
+from bulk_import import bulk_import_form
+from frames import CATEGORY, DATE, INTEGER, load_frame
+from instrumentation import stage
+from reports import PPTX_MIME, new_presentation, add_picture_slide, add_caption, presentation_to_bytes
 import io
 
-def generate_cost_pptx(chart, total_cost):
-    """PowerPointファイルを生成"""
-    ppt = Presentation()
-    slide = ppt.slides.add_slide(ppt.slide_layouts[5])
-    slide.shapes.title.text = "原価データ"
-    slide.shapes.add_picture(chart, Inches(1), Inches(1.5), width=Inches(6))
-    slide.shapes.add_textbox(Inches(1), Inches(4.5), Inches(6), Inches(1)).text = f"総原価: {total_cost:,} 円"
-    pptx_file = "cost_report.pptx"
-    ppt.save(pptx_file)
-    return pptx_file
+def generate_cost_pptx(chart_png, total_cost):
+    """PowerPointファイルを生成（バイト列で返す）"""
+    ppt = new_presentation()
+    slide = add_picture_slide(ppt, "原価データ", chart_png)
+    add_caption(slide, f"総原価: {total_cost:,} 円")
+    return presentation_to_bytes(ppt)
 
 def cost_management_page():
     st.header("原価管理")
+    owner = st.session_state["username"]
+    period = st.session_state["period"]
 
     # 原価データ登録フォーム
     with st.form("cost_form"):
@@ -29,16 +29,23 @@ def cost_management_page():
         submitted = st.form_submit_button("登録")
         if submitted:
             Database.execute_query(
-                "INSERT INTO costs (project, cost, date) VALUES (?, ?, ?)",
-                (project, cost, str(date))
+                "INSERT INTO costs (owner, project, cost, date) VALUES (?, ?, ?, ?)",
+                (owner, project, to_yen(cost), str(date))
             )
             st.success("原価データを登録しました！")
 
+    # CSV/Excelからの一括登録
+    bulk_import_form("costs")
+
     # 原価データ表示
-    data = Database.fetch_data("SELECT project, cost, date FROM costs")
-    df = pd.DataFrame(data, columns=["案件名", "原価金額", "日付"])
+    with stage("costs", "load"):
+        df = load_frame(
+            "SELECT project, cost, date FROM costs WHERE owner = ? AND date BETWEEN ? AND ?",
+            (owner, period.start, period.end),
+            [("案件名", CATEGORY), ("原価金額", INTEGER), ("日付", DATE)]
+        )
     if not df.empty:
-        st.dataframe(df)
+        st.dataframe(df, column_config={"日付": st.column_config.DateColumn(format="YYYY-MM-DD")})
 
         # 総原価を計算
         total_cost = df["原価金額"].sum()
@@ -55,13 +62,13 @@ def cost_management_page():
         # PowerPointエクスポート
         st.subheader("PowerPointエクスポート")
         if st.button("PowerPointファイルをダウンロード"):
-            chart_path = "cost_chart.png"
-            chart.save(chart_path)
-            pptx_file = generate_cost_pptx(chart_path, total_cost)
-            with open(pptx_file, "rb") as file:
-                st.download_button(
-                    label="PowerPointをダウンロード",
-                    data=file,
-                    file_name=pptx_file,
-                    mime="application/vnd.openxmlformats-officedocument.presentationml.presentation"
-                )
+            with stage("costs", "export"):
+                chart_buffer = io.BytesIO()
+                chart.save(chart_buffer, format="png")
+                pptx_data = generate_cost_pptx(chart_buffer.getvalue(), total_cost)
+            st.download_button(
+                label="PowerPointをダウンロード",
+                data=pptx_data,
+                file_name="cost_report.pptx",
+                mime=PPTX_MIME
+            )
@@ -1,12 +1,31 @@
 # dashboard.py
+import importlib
 import streamlit as st
-from sales_management import sales_management_page
-from cost_management import cost_management_page
-from sg_a_costs import sg_a_costs_page
-from profit_management import profit_management_page
-from cashflow_management import cashflow_management_page
-from tags_and_target import tags_and_target_page
 from database import Database
+from periods import PERIOD_KINDS, PERIOD_ALL, PERIOD_CUSTOM, period_for, custom_period
+
+# メニュー名 → (モジュール名, ページ関数名)
+# ページのモジュール（pandas・グラフ・PowerPoint関連を含む）は初めて選択されたときに読み込む
+PAGES = {
+    "ホーム": ("home", "home_page"),
+    "初期設定登録": ("tags_and_target", "tags_and_target_page"),
+    "売上管理": ("sales_management", "sales_management_page"),
+    "原価管理": ("cost_management", "cost_management_page"),
+    "販管費管理": ("sg_a_costs", "sg_a_costs_page"),
+    "利益管理": ("profit_management", "profit_management_page"),
+    "資金管理": ("cashflow_management", "cashflow_management_page"),
+    "経営レポート": ("management_report", "management_report_page"),
+    "データエクスポート": ("data_export", "data_export_page"),
+}
+# メニューに表示しないページ（URLに ?diagnostics=1 を付けたときだけ表示）
+HIDDEN_PAGES = {
+    "診断": ("diagnostics", "diagnostics_page"),
+}
+
+def load_page(name):
+    """ページ関数を返す（モジュールは初回のみ読み込まれ、以降はsys.modulesから再利用される）"""
+    module_name, function_name = PAGES.get(name) or HIDDEN_PAGES[name]
+    return getattr(importlib.import_module(module_name), function_name)
 
 # ページ設定
 st.set_page_config(page_title="経営ダッシュボード", layout="wide")
@@ -35,7 +54,7 @@ def login_page():
             st.success("ログイン成功！")
             st.session_state["authenticated"] = True
             st.session_state["username"] = username
-            st.session_state["current_page"] = "初期設定登録"  # ログイン後の遷移先
+            st.session_state["current_page"] = "ホーム"  # ログイン後の遷移先
         else:
             st.error("ユーザー名またはパスワードが間違っています。")
     if st.button("ユーザー登録はこちら", key="to_register"):
@@ -58,43 +77,38 @@ def registration_page():
     if st.button("ログイン画面に戻る", key="to_login"):
         st.session_state["current_page"] = "ログイン"
 
+# 集計期間の選択（選んだ期間はsession_state["period"]に入れ、各ページのクエリに渡す）
+def period_selector():
+    kind = st.sidebar.selectbox("集計期間", PERIOD_KINDS, key="period_kind")
+    if kind == PERIOD_CUSTOM:
+        col1, col2 = st.sidebar.columns(2)
+        start = col1.date_input("開始月", key="period_start")
+        end = col2.date_input("終了月", key="period_end")
+        period = custom_period(start, end)
+    else:
+        period = period_for(kind)
+    st.session_state["period"] = period
+    if kind != PERIOD_ALL:
+        st.sidebar.caption(f"{period.start_month} 〜 {period.end_month}")
+
 # メインページ
 def main_page():
     # サイドバー
     st.sidebar.header(f"メニュー - ようこそ、{st.session_state['username']} さん！")
-    menu = st.sidebar.radio("ページを選択してください", [
-        "初期設定登録",
-        "売上管理",
-        "原価管理",
-        "販管費管理",
-        "利益管理",
-        "資金管理",
-        "ログアウト"
-    ])
+    pages = list(PAGES)
+    if st.query_params.get("diagnostics") == "1":
+        pages += list(HIDDEN_PAGES)
+    menu = st.sidebar.radio("ページを選択してください", pages + ["ログアウト"])
+    period_selector()
 
     # ページ分岐
-    if menu == "初期設定登録":
-        st.session_state["current_page"] = "初期設定登録"
-        tags_and_target_page()
-    elif menu == "売上管理":
-        st.session_state["current_page"] = "売上管理"
-        sales_management_page()
-    elif menu == "原価管理":
-        st.session_state["current_page"] = "原価管理"
-        cost_management_page()
-    elif menu == "販管費管理":
-        st.session_state["current_page"] = "販管費管理"
-        sg_a_costs_page()
-    elif menu == "利益管理":
-        st.session_state["current_page"] = "利益管理"
-        profit_management_page()
-    elif menu == "資金管理":
-        st.session_state["current_page"] = "資金管理"
-        cashflow_management_page()
-    elif menu == "ログアウト":
+    if menu == "ログアウト":
         st.session_state["authenticated"] = False
         st.session_state["username"] = None
         st.session_state["current_page"] = "ログイン"  # ログアウト後はログイン画面に戻る
+    else:
+        st.session_state["current_page"] = menu
+        load_page(menu)()
 
 # ページ管理
 if not st.session_state["authenticated"]:
@@ -0,0 +1,163 @@
+# data_export.py
+# テーブル単位のデータエクスポート（fetchmanyで少しずつ読み、CSV/Parquetに逐次書き出す）
+import argparse
+import csv
+import os
+import tempfile
+from typing import Iterator, List, Optional, Tuple
+
+from database import Database
+
+# エクスポート対象テーブル（列, 期間指定に使う列）
+EXPORT_TABLES = {
+    "sales": (["id", "project", "tag", "revenue", "date", "owner"], "date"),
+    "costs": (["id", "project", "cost", "date", "owner"], "date"),
+    "sg_a_costs": (["id", "category", "amount", "date", "owner"], "date"),
+    "cashflow": (["id", "month", "inflow", "outflow", "owner"], "month"),
+    "profits": (["date", "revenue", "cost", "sg_a_cost", "profit", "owner"], "date"),
+}
+# テーブルの列ではなく式で書き出す列（売上のタグはtagsからタグ名を引く）
+EXPORT_EXPRESSIONS = {
+    ("sales", "tag"): "(SELECT tag_name FROM tags WHERE tags.id = sales.tag_id)",
+}
+# Parquetの列の型（ここにない列は文字列）
+PARQUET_TYPES = {
+    "id": "int64",
+    # 金額は整数の円
+    "revenue": "int64", "cost": "int64", "amount": "int64",
+    "inflow": "int64", "outflow": "int64", "sg_a_cost": "int64", "profit": "int64",
+}
+EXPORT_FORMATS = ["csv", "parquet"]
+
+
+def iter_rows(table: str, start: Optional[str] = None, end: Optional[str] = None,
+              batch_size: Optional[int] = None, owner: Optional[str] = None) -> Iterator[List[Tuple]]:
+    """テーブルの行をbatch_size件ずつ返す（start/endは期間列の下限・上限、両端を含む。ownerを渡すとそのユーザーの行だけ）"""
+    columns, period_column = EXPORT_TABLES[table]
+    conditions, params = [], []
+    if owner is not None:
+        conditions.append("owner = ?")
+        params.append(owner)
+    if start:
+        conditions.append(f"{period_column} >= ?")
+        params.append(start)
+    if end:
+        conditions.append(f"{period_column} <= ?")
+        params.append(end)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    select = ", ".join(EXPORT_EXPRESSIONS.get((table, column), column) for column in columns)
+    query = f"SELECT {select} FROM {table} {where} ORDER BY {period_column}, {columns[0]}"
+    yield from Database.fetch_many(query, tuple(params), batch_size)
+
+
+def write_csv(table: str, fileobj, start: Optional[str] = None, end: Optional[str] = None,
+              owner: Optional[str] = None) -> int:
+    """CSVをテキストファイルに書き出し、書き出した行数を返す"""
+    columns, _ = EXPORT_TABLES[table]
+    writer = csv.writer(fileobj)
+    writer.writerow(columns)
+    count = 0
+    for rows in iter_rows(table, start, end, owner=owner):
+        writer.writerows(rows)
+        count += len(rows)
+    return count
+
+
+def write_parquet(table: str, fileobj, start: Optional[str] = None, end: Optional[str] = None,
+                  owner: Optional[str] = None) -> int:
+    """Parquetをバッチ（行グループ）ごとに書き出し、書き出した行数を返す（pyarrowが必要）"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    columns, _ = EXPORT_TABLES[table]
+    schema = pa.schema([(column, pa.type_for_alias(PARQUET_TYPES.get(column, "string"))) for column in columns])
+    count = 0
+    with pq.ParquetWriter(fileobj, schema) as writer:
+        for rows in iter_rows(table, start, end, owner=owner):
+            batch = pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)],
+                schema=schema
+            )
+            writer.write_table(batch)
+            count += len(rows)
+    return count
+
+
+def export_table(table: str, fmt: str, fileobj, start: Optional[str] = None, end: Optional[str] = None,
+                 owner: Optional[str] = None) -> int:
+    """fmt（csv/parquet）形式でfileobjに書き出す。CSVはテキスト、Parquetはバイナリのファイルを渡す"""
+    if fmt == "csv":
+        return write_csv(table, fileobj, start, end, owner)
+    if fmt == "parquet":
+        return write_parquet(table, fileobj, start, end, owner)
+    raise ValueError(f"不明な形式: {fmt}")
+
+
+def data_export_page():
+    import streamlit as st
+
+    st.header("データエクスポート")
+    owner = st.session_state["username"]
+    table = st.selectbox("テーブル", list(EXPORT_TABLES))
+    fmt = st.selectbox("形式", EXPORT_FORMATS)
+    use_period = st.checkbox("期間を指定する")
+    start = end = None
+    if use_period:
+        col1, col2 = st.columns(2)
+        start_date = col1.date_input("開始日")
+        end_date = col2.date_input("終了日")
+        if table in ("cashflow", "profits"):
+            start, end = start_date.strftime("%Y-%m"), end_date.strftime("%Y-%m")
+        else:
+            start, end = str(start_date), str(end_date)
+
+    st.caption("ダウンロードするファイルは一時的にサーバーのメモリに置かれます。"
+               "非常に大きなデータは python data_export.py（コマンドライン）で書き出してください。")
+    if st.button("エクスポート"):
+        # DBからはバッチごとに読み、メモリではなく一時ファイルに逐次書き出す
+        if fmt == "csv":
+            output = tempfile.NamedTemporaryFile("w", encoding="utf-8-sig", newline="", suffix=".csv", delete=False)
+        else:
+            output = tempfile.NamedTemporaryFile("wb", suffix=".parquet", delete=False)
+        try:
+            try:
+                with output:
+                    count = export_table(table, fmt, output, start, end, owner)
+            except ImportError as e:
+                st.error(f"Parquet形式の出力にはpyarrowが必要です: {e}")
+                return
+            st.success(f"{count:,} 件のデータを書き出しました！")
+            with open(output.name, "rb") as f:
+                st.download_button(
+                    label="ファイルをダウンロード",
+                    data=f,
+                    file_name=f"{table}.{fmt}",
+                    mime="text/csv" if fmt == "csv" else "application/octet-stream"
+                )
+        finally:
+            os.remove(output.name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="テーブルをCSV/Parquetに書き出す")
+    parser.add_argument("table", choices=list(EXPORT_TABLES))
+    parser.add_argument("output", help="出力ファイル")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    parser.add_argument("--start", help="期間の開始（YYYY-MM-DD、cashflow/profitsはYYYY-MM）")
+    parser.add_argument("--end", help="期間の終了（YYYY-MM-DD、cashflow/profitsはYYYY-MM）")
+    parser.add_argument("--owner", help="このユーザーのデータだけを書き出す（省略時は全ユーザー）")
+    parser.add_argument("--db", default=Database.DB_FILE, help="データベースファイル")
+    args = parser.parse_args()
+
+    Database.DB_FILE = args.db
+    if args.format == "csv":
+        with open(args.output, "w", encoding="utf-8-sig", newline="") as f:
+            count = write_csv(args.table, f, args.start, args.end, args.owner)
+    else:
+        with open(args.output, "wb") as f:
+            count = write_parquet(args.table, f, args.start, args.end, args.owner)
+    print(f"{args.table}: {count} 件を {args.output} に書き出しました")
+
+
+if __name__ == "__main__":
+    main()
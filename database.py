@@ -1,13 +1,306 @@
 # database.py
 import sqlite3
 import logging
-from typing import List, Tuple, Optional
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Tuple, Optional, Sequence, Set, TypeVar, Union
+
+from instrumentation import record, record_query, normalize_query
+from periods import normalize_month
 
 logging.basicConfig(level=logging.ERROR, format="%(asctime)s - %(message)s")
 
+# マイグレーションの1ステップ（SQL文、またはカーソルを受け取る関数）
+MigrationStep = Union[str, Callable[[sqlite3.Cursor], None]]
+T = TypeVar("T")
+
+
+class WriteRequest(NamedTuple):
+    """書き込みスレッドに渡す1件の書き込み（manyがTrueならparamsはパラメータの列）
+
+    jobがあればqueryの代わりにjob(cursor)を実行し、その戻り値を結果にする（tablesは書き込むテーブル）。
+    """
+    query: Optional[str]
+    params: Any
+    many: bool
+    future: Future
+    job: Optional[Callable[[sqlite3.Cursor], Any]] = None
+    tables: Tuple[str, ...] = ()
+
+
+class _FailedWrite(Exception):
+    """グループコミット中の1件の書き込みが失敗した（その書き込みを除いてやり直す）"""
+
+    def __init__(self, index: int, error: Exception):
+        super().__init__(str(error))
+        self.index = index
+        self.error = error
+
+# (元テーブル, 金額列, profitsの列, 利益への符号)
+PROFIT_SOURCES = [
+    ("sales", "revenue", "revenue", "+"),
+    ("costs", "cost", "cost", "-"),
+    ("sg_a_costs", "amount", "sg_a_cost", "-"),
+]
+
+def _profit_rollup_steps(by_owner: bool = False) -> List[str]:
+    """sales・costs・sg_a_costsの変更時に該当月のprofits行だけを更新するトリガーを作成する
+
+    by_ownerがTrueなら、profitsの行を (owner, 月) ごとに持つ。
+    """
+    steps = []
+    for table, value, column, sign in PROFIT_SOURCES:
+        def ensure_month(row):
+            if by_owner:
+                return (
+                    "INSERT INTO profits (revenue, cost, sg_a_cost, profit, date, owner) "
+                    f"VALUES (0, 0, 0, 0, strftime('%Y-%m', {row}.date), {row}.owner) "
+                    "ON CONFLICT (owner, date) DO NOTHING;"
+                )
+            return (
+                "INSERT INTO profits (revenue, cost, sg_a_cost, profit, date) "
+                f"VALUES (0, 0, 0, 0, strftime('%Y-%m', {row}.date)) ON CONFLICT (date) DO NOTHING;"
+            )
+
+        def apply_delta(row, op):
+            profit_op = op if sign == "+" else ("-" if op == "+" else "+")
+            owner_condition = f" AND owner = {row}.owner" if by_owner else ""
+            return (
+                f"UPDATE profits SET {column} = {column} {op} {row}.{value}, "
+                f"profit = profit {profit_op} {row}.{value} "
+                f"WHERE date = strftime('%Y-%m', {row}.date){owner_condition};"
+            )
+
+        steps.append(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_profits_insert AFTER INSERT ON {table}
+            BEGIN
+                {ensure_month("NEW")}
+                {apply_delta("NEW", "+")}
+            END
+        """)
+        steps.append(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_profits_delete AFTER DELETE ON {table}
+            BEGIN
+                {apply_delta("OLD", "-")}
+            END
+        """)
+        steps.append(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_profits_update
+            AFTER UPDATE OF {value}, date{", owner" if by_owner else ""} ON {table}
+            BEGIN
+                {apply_delta("OLD", "-")}
+                {ensure_month("NEW")}
+                {apply_delta("NEW", "+")}
+            END
+        """)
+    return steps
+
+
+def _drop_profit_rollup_steps() -> List[str]:
+    return [
+        f"DROP TRIGGER IF EXISTS trg_{table}_profits_{event}"
+        for table, _, _, _ in PROFIT_SOURCES
+        for event in ("insert", "delete", "update")
+    ]
+
+
+def _add_owner_columns(cursor: sqlite3.Cursor) -> None:
+    """データテーブルにowner列を追加し、既存データは最初に登録されたユーザーのものとする"""
+    cursor.execute("SELECT username FROM users ORDER BY id LIMIT 1")
+    first_user = cursor.fetchone()
+    legacy_owner = first_user[0] if first_user else ""
+    for table in ("sales", "costs", "sg_a_costs", "cashflow", "tags", "target_revenue", "profits"):
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN owner TEXT NOT NULL DEFAULT ''")
+        cursor.execute(f"UPDATE {table} SET owner = ?", (legacy_owner,))
+
+
+
+# 金額を整数の円で持つテーブル定義（マイグレーション6で作り直す）
+# (テーブル, CREATE文, 旧テーブルからの変換SELECT)。売上と目標売上は千円単位で登録されていたため1000倍する
+MONEY_TABLES = [
+    ("sales", """
+        CREATE TABLE sales (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project TEXT NOT NULL,
+            tag TEXT,
+            revenue INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            owner TEXT NOT NULL DEFAULT ''
+        )
+    """, "SELECT id, project, tag, CAST(ROUND(revenue * 1000) AS INTEGER), date, owner FROM sales"),
+    ("costs", """
+        CREATE TABLE costs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project TEXT NOT NULL,
+            cost INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            owner TEXT NOT NULL DEFAULT ''
+        )
+    """, "SELECT id, project, CAST(ROUND(cost) AS INTEGER), date, owner FROM costs"),
+    ("sg_a_costs", """
+        CREATE TABLE sg_a_costs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            category TEXT NOT NULL,
+            amount INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            owner TEXT NOT NULL DEFAULT ''
+        )
+    """, "SELECT id, category, CAST(ROUND(amount) AS INTEGER), date, owner FROM sg_a_costs"),
+    ("cashflow", """
+        CREATE TABLE cashflow (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            month TEXT NOT NULL,
+            inflow INTEGER NOT NULL,
+            outflow INTEGER NOT NULL,
+            owner TEXT NOT NULL DEFAULT ''
+        )
+    """, "SELECT id, month, CAST(ROUND(inflow) AS INTEGER), CAST(ROUND(outflow) AS INTEGER), owner FROM cashflow"),
+    ("target_revenue", """
+        CREATE TABLE target_revenue (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            amount INTEGER NOT NULL,
+            owner TEXT NOT NULL DEFAULT ''
+        )
+    """, "SELECT id, CAST(ROUND(amount * 1000) AS INTEGER), owner FROM target_revenue"),
+    ("profits", """
+        CREATE TABLE profits (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            revenue INTEGER NOT NULL,
+            cost INTEGER NOT NULL,
+            sg_a_cost INTEGER NOT NULL,
+            profit INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            owner TEXT NOT NULL DEFAULT ''
+        )
+    """, None),
+]
+
+
+def _rebuild_money_tables(cursor: sqlite3.Cursor) -> None:
+    """金額列をINTEGER（円）にしたテーブルを作り直し、既存データを変換して移す（索引は作り直す）"""
+    for table, create_query, select_query in MONEY_TABLES:
+        cursor.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (table,)
+        )
+        index_queries = [row[0] for row in cursor.fetchall()]
+        cursor.execute(create_query.replace(f"TABLE {table} (", f"TABLE {table}_new (", 1))
+        if select_query:
+            cursor.execute(f"INSERT INTO {table}_new {select_query}")
+        cursor.execute(f"DROP TABLE {table}")
+        cursor.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+        for index_query in index_queries:
+            cursor.execute(index_query)
+
+    # 月次損益は変換後の金額から集計し直す
+    cursor.execute("""
+        INSERT INTO profits (revenue, cost, sg_a_cost, profit, date, owner)
+        SELECT SUM(revenue), SUM(cost), SUM(sg_a_cost), SUM(revenue) - SUM(cost) - SUM(sg_a_cost), month, owner
+        FROM (
+            SELECT owner, strftime('%Y-%m', date) AS month, revenue, 0 AS cost, 0 AS sg_a_cost FROM sales
+            UNION ALL
+            SELECT owner, strftime('%Y-%m', date), 0, cost, 0 FROM costs
+            UNION ALL
+            SELECT owner, strftime('%Y-%m', date), 0, 0, amount FROM sg_a_costs
+        )
+        GROUP BY owner, month
+    """)
+
+
+def _normalize_cashflow_months(cursor: sqlite3.Cursor) -> None:
+    """資金データの月をYYYY-MMにそろえ、期間で範囲検索できるようにする（解釈できない値はそのまま）"""
+    cursor.execute("SELECT DISTINCT month FROM cashflow")
+    updates = []
+    for (month,) in cursor.fetchall():
+        normalized = normalize_month(month)
+        if normalized and normalized != month:
+            updates.append((normalized, month))
+    cursor.executemany("UPDATE cashflow SET month = ? WHERE month = ?", updates)
+
+
+def _add_sales_tag_ids(cursor: sqlite3.Cursor) -> None:
+    """売上のタグ名をtagsのidに置き換える（tagsにないタグ名はそのユーザーのタグとして登録する）"""
+    cursor.execute("ALTER TABLE sales ADD COLUMN tag_id INTEGER REFERENCES tags (id)")
+    cursor.execute("""
+        INSERT INTO tags (owner, tag_name)
+        SELECT DISTINCT owner, tag FROM sales
+        WHERE tag IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM tags WHERE tags.owner = sales.owner AND tags.tag_name = sales.tag)
+    """)
+    # 同じ名前のタグが複数あれば最初に登録されたものにそろえる
+    cursor.execute("""
+        UPDATE sales SET tag_id = (
+            SELECT MIN(id) FROM tags WHERE tags.owner = sales.owner AND tags.tag_name = sales.tag
+        )
+        WHERE tag IS NOT NULL
+    """)
+
 class Database:
     DB_FILE = "dashboard_data.db"
-    SCHEMA_VERSION = 1
+    # TABLESで作成される初期スキーマのバージョン
+    BASE_SCHEMA_VERSION = 1
+    # init_dbを済ませたDB_FILE（プロセス内で1回だけマイグレーションを確かめる）
+    _initialized: Set[str] = set()
+    _init_lock = threading.Lock()
+
+    # 接続ごとに一度だけ設定するPRAGMA（WAL、同期レベル、キャッシュ等）
+    PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA cache_size=-20000",  # 約20MBのページキャッシュ
+        "PRAGMA mmap_size=268435456",  # 256MBまでメモリマップ
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA busy_timeout=5000",  # ほかのプロセスが書き込み中なら最大5秒待つ
+    )
+    FETCH_BATCH_SIZE = 1000
+    # fetch_batch(parallel=True) で使うスレッド数（各スレッドはプールから別の接続を借りて読む）
+    BATCH_WORKERS = 4
+
+    # 接続はプロセス全体で共有するプールに置き、Streamlitの再実行（毎回別のスレッド）をまたいで再利用する
+    # プールに残す接続の数（同時に借りられる数の上限ではない）
+    POOL_MAX_IDLE = 8
+    _pool: "queue.LifoQueue[Tuple[str, sqlite3.Connection]]" = queue.LifoQueue()
+    # 現在のスレッドが借りている接続と、開いている読み取りトランザクションの開始時の世代番号
+    _local = threading.local()
+    _batch_executor: Optional[ThreadPoolExecutor] = None
+    _batch_executor_lock = threading.Lock()
+
+    # 書き込みはすべてのセッションから1つの書き込みスレッドに集め、順番に実行する
+    # 待っている書き込みはWRITE_BATCH_MAX件までまとめて1トランザクションでコミットする（グループコミット）
+    WRITE_BATCH_MAX = 100
+    # ロック競合（database is locked / busy）時のやり直し回数と、初回の待ち時間（やり直すたびに倍にする）
+    WRITE_RETRIES = 5
+    WRITE_RETRY_BACKOFF_SECONDS = 0.05
+    _write_queue: "queue.Queue[WriteRequest]" = queue.Queue()
+    _writer: Optional[threading.Thread] = None
+    _writer_lock = threading.Lock()
+
+    # クエリ結果キャッシュ（テーブルごとの世代番号が変わったエントリは無効）
+    CACHE_MAX_ENTRIES = 256
+    CACHE_TTL_SECONDS = 300
+    # キャッシュ全体で持つ行数の上限（超えたら古いエントリから捨てる）と、キャッシュしない大きな結果の行数
+    # （明細をそのまま読むクエリの結果でメモリが膨らまないようにする）
+    CACHE_MAX_ROWS = 200000
+    CACHE_MAX_RESULT_ROWS = 20000
+    _generations: Dict[str, int] = {}
+    _cache: "OrderedDict[tuple, Tuple[float, Dict[str, int], List[Tuple]]]" = OrderedDict()
+    _cache_rows = 0
+    _cache_lock = threading.Lock()
+    # トリガーで連動して更新されるテーブル
+    TABLE_DEPENDENTS = {
+        "sales": ("profits",),
+        "costs": ("profits",),
+        "sg_a_costs": ("profits",),
+    }
+    _WRITE_TABLE_RE = re.compile(
+        r"^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)\s+(\w+)",
+        re.IGNORECASE
+    )
+    _READ_TABLE_RE = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)", re.IGNORECASE)
 
     TABLES = {
         "sales": """
@@ -74,62 +367,547 @@ class Database:
         """
     }
 
+    # バージョン順のマイグレーション（version, 説明, ステップ）。各バージョンは1トランザクションで適用する
+    MIGRATIONS: List[Tuple[int, str, List[MigrationStep]]] = [
+        (2, "日付・タグ・案件・月の索引を追加", [
+            # 期間指定の集計（WHERE date ... / strftime('%Y-%m', date)）用のカバリング索引
+            "CREATE INDEX IF NOT EXISTS idx_sales_date ON sales (date, revenue)",
+            "CREATE INDEX IF NOT EXISTS idx_costs_date ON costs (date, cost)",
+            "CREATE INDEX IF NOT EXISTS idx_sg_a_costs_date ON sg_a_costs (date, amount)",
+            "CREATE INDEX IF NOT EXISTS idx_cashflow_month ON cashflow (month, inflow, outflow)",
+            # GROUP BY タグ・案件・費目用のカバリング索引
+            "CREATE INDEX IF NOT EXISTS idx_sales_tag ON sales (tag, revenue)",
+            "CREATE INDEX IF NOT EXISTS idx_sales_project ON sales (project, date)",
+            "CREATE INDEX IF NOT EXISTS idx_costs_project ON costs (project, cost)",
+            "CREATE INDEX IF NOT EXISTS idx_sg_a_costs_category ON sg_a_costs (category, amount)",
+        ]),
+        (3, "profitsを月次損益の集計テーブルとして使用", [
+            # profitsは1か月1行（dateはYYYY-MM）
+            "DELETE FROM profits",
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_profits_date ON profits (date)",
+            """
+            INSERT INTO profits (revenue, cost, sg_a_cost, profit, date)
+            SELECT SUM(revenue), SUM(cost), SUM(sg_a_cost),
+                   SUM(revenue) - SUM(cost) - SUM(sg_a_cost), month
+            FROM (
+                SELECT strftime('%Y-%m', date) AS month, revenue, 0 AS cost, 0 AS sg_a_cost FROM sales
+                UNION ALL
+                SELECT strftime('%Y-%m', date), 0, cost, 0 FROM costs
+                UNION ALL
+                SELECT strftime('%Y-%m', date), 0, 0, amount FROM sg_a_costs
+            )
+            GROUP BY month
+            """,
+        ] + _profit_rollup_steps()),
+        (4, "売上一覧のキーセットページング用の索引を追加", [
+            # ORDER BY date, id と (date, id) > (?, ?) をそのまま索引で処理する
+            "CREATE INDEX IF NOT EXISTS idx_sales_date_id ON sales (date, id)",
+        ]),
+        (5, "ユーザーごとのデータ分割（owner列と、ownerを先頭にした索引）", [
+            _add_owner_columns,
+            # 索引はすべて owner を先頭にしたものに置き換える
+            "DROP INDEX IF EXISTS idx_sales_date",
+            "DROP INDEX IF EXISTS idx_sales_tag",
+            "DROP INDEX IF EXISTS idx_sales_project",
+            "DROP INDEX IF EXISTS idx_sales_date_id",
+            "DROP INDEX IF EXISTS idx_costs_date",
+            "DROP INDEX IF EXISTS idx_costs_project",
+            "DROP INDEX IF EXISTS idx_sg_a_costs_date",
+            "DROP INDEX IF EXISTS idx_sg_a_costs_category",
+            "DROP INDEX IF EXISTS idx_cashflow_month",
+            "DROP INDEX IF EXISTS idx_profits_date",
+            "CREATE INDEX idx_sales_owner_date ON sales (owner, date, revenue)",
+            "CREATE INDEX idx_sales_owner_tag ON sales (owner, tag, revenue)",
+            "CREATE INDEX idx_sales_owner_project ON sales (owner, project, date)",
+            "CREATE INDEX idx_sales_owner_date_id ON sales (owner, date, id)",
+            "CREATE INDEX idx_costs_owner_date ON costs (owner, date, cost)",
+            "CREATE INDEX idx_costs_owner_project ON costs (owner, project, cost)",
+            "CREATE INDEX idx_sg_a_costs_owner_date ON sg_a_costs (owner, date, amount)",
+            "CREATE INDEX idx_sg_a_costs_owner_category ON sg_a_costs (owner, category, amount)",
+            "CREATE INDEX idx_cashflow_owner_month ON cashflow (owner, month, inflow, outflow)",
+            "CREATE INDEX idx_tags_owner ON tags (owner, tag_name)",
+            "CREATE INDEX idx_target_revenue_owner ON target_revenue (owner)",
+            "CREATE UNIQUE INDEX idx_profits_owner_date ON profits (owner, date)",
+        ] + _drop_profit_rollup_steps() + _profit_rollup_steps(by_owner=True)),
+        (6, "金額を整数（円）で保存", _drop_profit_rollup_steps() + [
+            _rebuild_money_tables,
+        ] + _profit_rollup_steps(by_owner=True)),
+        (7, "資金データの月をYYYY-MMに統一", [
+            _normalize_cashflow_months,
+        ]),
+        (8, "資金の期首残高テーブルを追加", [
+            # 資金データの最初の月より前の残高（ユーザーごとに1行、整数の円）
+            """
+            CREATE TABLE cash_opening_balance (
+                owner TEXT PRIMARY KEY,
+                amount INTEGER NOT NULL
+            )
+            """,
+        ]),
+        (9, "案件・タグ別の月次売上用に月の生成列と索引を追加", [
+            # GROUP BY 案件・タグ, 月 を索引の順に読めるよう、月（YYYY-MM）を生成列として持つ
+            "ALTER TABLE sales ADD COLUMN month TEXT GENERATED ALWAYS AS (substr(date, 1, 7)) VIRTUAL",
+            "CREATE INDEX idx_sales_owner_project_month ON sales (owner, project, month, revenue)",
+            "CREATE INDEX idx_sales_owner_tag_month ON sales (owner, tag, month, revenue)",
+        ]),
+        (10, "売上のタグをtagsのid（整数の外部キー）で参照", [
+            _add_sales_tag_ids,
+            "DROP INDEX IF EXISTS idx_sales_owner_tag",
+            "DROP INDEX IF EXISTS idx_sales_owner_tag_month",
+            "ALTER TABLE sales DROP COLUMN tag",
+            # タグ別の集計は (owner, tag_id, 月) の索引で読み、タグ名はtagsと結合して引く
+            "CREATE INDEX idx_sales_owner_tag_id_month ON sales (owner, tag_id, month, revenue)",
+        ]),
+    ]
+    SCHEMA_VERSION = MIGRATIONS[-1][0]
+
     @staticmethod
-    def init_db():
-        conn = sqlite3.connect(Database.DB_FILE)
-        cursor = conn.cursor()
-        try:
-            # スキーマバージョンテーブル
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS schema_version (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    version INTEGER NOT NULL
-                )
-            """)
-            cursor.execute("SELECT MAX(version) FROM schema_version")
-            current_version = cursor.fetchone()[0] or 0
+    def _connect() -> sqlite3.Connection:
+        """新しい接続を作り、PRAGMAを設定する（プールに入れてスレッドをまたいで使う）"""
+        conn = sqlite3.connect(Database.DB_FILE, check_same_thread=False)
+        for pragma in Database.PRAGMAS:
+            conn.execute(pragma)
+        return conn
 
-            # テーブル作成または更新
-            if current_version < Database.SCHEMA_VERSION:
-                for create_query in Database.TABLES.values():
-                    cursor.execute(create_query)
+    @staticmethod
+    @contextmanager
+    def connection() -> Iterator[sqlite3.Connection]:
+        """プロセス共有のプールから接続を借り、抜けるときに返す
 
-                cursor.execute("INSERT INTO schema_version (version) VALUES (?)", (Database.SCHEMA_VERSION,))
-            conn.commit()
-        except sqlite3.Error as e:
-            logging.error(f"データベース初期化エラー: {e}")
-            raise
+        同じスレッドで入れ子に呼ぶと、外側で借りている接続をそのまま返す（read_snapshot内のクエリ等）。
+        """
+        held = getattr(Database._local, "conn", None)
+        if held is not None:
+            yield held
+            return
+        db_file = Database.DB_FILE
+        conn = None
+        while conn is None:
+            try:
+                pooled_file, pooled = Database._pool.get_nowait()
+            except queue.Empty:
+                conn = Database._connect()
+                break
+            if pooled_file == db_file:
+                conn = pooled
+            else:
+                pooled.close()
+        Database._local.conn = conn
+        try:
+            yield conn
         finally:
+            Database._local.conn = None
+            if conn.in_transaction:
+                conn.rollback()
+            if db_file == Database.DB_FILE and Database._pool.qsize() < Database.POOL_MAX_IDLE:
+                Database._pool.put((db_file, conn))
+            else:
+                conn.close()
+
+    @staticmethod
+    def close_connections() -> None:
+        """プールにある接続をすべて閉じる（DB_FILEを切り替えた後の後始末など）"""
+        while True:
+            try:
+                _, conn = Database._pool.get_nowait()
+            except queue.Empty:
+                return
             conn.close()
 
     @staticmethod
-    def execute_query(query: str, params: Optional[Tuple] = None) -> None:
-        conn = sqlite3.connect(Database.DB_FILE)
+    def bump_generation(*tables: str) -> None:
+        """テーブルの世代番号を進め、そのテーブルを読むキャッシュを無効にする（引数なしなら全テーブル）"""
+        with Database._cache_lock:
+            if not tables:
+                # "*"は全テーブル共通の世代番号
+                Database._generations["*"] = Database._generations.get("*", 0) + 1
+                Database._cache.clear()
+                Database._cache_rows = 0
+                return
+            for table in tables:
+                for name in (table,) + Database.TABLE_DEPENDENTS.get(table, ()):
+                    Database._generations[name] = Database._generations.get(name, 0) + 1
+
+    @staticmethod
+    def generation(*tables: str) -> Tuple[int, ...]:
+        """テーブルの現在の世代番号（派生データのキャッシュキーに使う）"""
+        with Database._cache_lock:
+            return tuple(Database._generations.get(table, 0) for table in tables + ("*",))
+
+    @staticmethod
+    def _bump_written_table(query: str) -> None:
+        match = Database._WRITE_TABLE_RE.match(query)
+        if match:
+            Database.bump_generation(match.group(1).lower())
+        else:
+            Database.bump_generation()
+
+    @staticmethod
+    def init_db():
+        """スキーマを作成し、未適用のマイグレーションを適用する
+
+        Streamlitの再実行ごとに呼ばれるため、実際の処理はプロセス内でDB_FILEごとに1回だけ行う。
+        複数のプロセス・セッションが同時に起動しても二重に適用しないよう、
+        各バージョンは書き込みロック（BEGIN IMMEDIATE）を取ってから適用済みかを確かめる。
+        """
+        with Database._init_lock:
+            if Database.DB_FILE in Database._initialized:
+                return
+            with Database.connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    # スキーマバージョンテーブルと初期テーブル
+                    cursor.execute("BEGIN IMMEDIATE")
+                    cursor.execute("""
+                        CREATE TABLE IF NOT EXISTS schema_version (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            version INTEGER NOT NULL
+                        )
+                    """)
+                    if Database._schema_version(cursor) < Database.BASE_SCHEMA_VERSION:
+                        for create_query in Database.TABLES.values():
+                            cursor.execute(create_query)
+                        cursor.execute(
+                            "INSERT INTO schema_version (version) VALUES (?)", (Database.BASE_SCHEMA_VERSION,)
+                        )
+                    conn.commit()
+
+                    # 未適用のマイグレーションを順番に適用
+                    for version, description, steps in Database.MIGRATIONS:
+                        Database._apply_migration(conn, version, description, steps)
+                except sqlite3.Error as e:
+                    conn.rollback()
+                    logging.error(f"データベース初期化エラー: {e}")
+                    raise
+                finally:
+                    cursor.close()
+            Database._initialized.add(Database.DB_FILE)
+        Database.bump_generation()
+
+    @staticmethod
+    def _schema_version(cursor: sqlite3.Cursor) -> int:
+        cursor.execute("SELECT MAX(version) FROM schema_version")
+        return cursor.fetchone()[0] or 0
+
+    @staticmethod
+    def _apply_migration(conn: sqlite3.Connection, version: int, description: str,
+                         steps: List[MigrationStep]) -> None:
+        """1つのマイグレーションを書き込みトランザクション内で適用し、バージョンを記録する
+
+        ロックを取った後に現在のバージョンを読み直し、ほかの接続が適用済みなら何もしない。
+        """
         cursor = conn.cursor()
         try:
-            if params:
-                cursor.execute(query, params)
-            else:
-                cursor.execute(query)
+            cursor.execute("BEGIN IMMEDIATE")
+            if Database._schema_version(cursor) >= version:
+                conn.rollback()
+                return
+            for step in steps:
+                if callable(step):
+                    step(cursor)
+                else:
+                    cursor.execute(step)
+            cursor.execute("INSERT INTO schema_version (version) VALUES (?)", (version,))
             conn.commit()
         except sqlite3.Error as e:
-            logging.error(f"SQLエラー: {e} | クエリ: {query} | パラメータ: {params}")
+            conn.rollback()
+            logging.error(f"マイグレーションエラー: v{version}（{description}）: {e}")
             raise
         finally:
-            conn.close()
+            cursor.close()
 
     @staticmethod
-    def fetch_data(query: str, params: Optional[Tuple] = None) -> List[Tuple]:
-        conn = sqlite3.connect(Database.DB_FILE)
-        cursor = conn.cursor()
-        try:
-            if params:
-                cursor.execute(query, params)
+    def _is_busy(error: sqlite3.Error) -> bool:
+        """ほかの接続がロックを持っているための失敗か（やり直せば成功しうる）"""
+        message = str(error).lower()
+        return isinstance(error, sqlite3.OperationalError) and ("locked" in message or "busy" in message)
+
+    @staticmethod
+    def submit_write(query: str, params: Any = None, many: bool = False) -> "Future[int]":
+        """書き込みを書き込みスレッドに渡し、変更行数を返すFutureを返す
+
+        コミット後（キャッシュの無効化も済んだ後）に結果が設定される。SQLエラーはFutureの例外になる。
+        """
+        future: "Future[int]" = Future()
+        Database._ensure_writer()
+        Database._write_queue.put(WriteRequest(query, params, many, future))
+        return future
+
+    @staticmethod
+    def submit_job(job: Callable[[sqlite3.Cursor], T], *tables: str) -> "Future[T]":
+        """job(cursor)を書き込みスレッドの1トランザクション内で実行し、その戻り値を返すFutureを返す
+
+        tablesには書き込むテーブルを渡す（省略時はすべてのキャッシュを無効にする）。
+        ロック競合時はやり直すため、jobは何度実行しても同じ結果になるようにすること。
+        jobの例外（SQLエラー以外も含む）はそのjobだけを取り消してFutureの例外になる。
+        """
+        future: "Future[T]" = Future()
+        Database._ensure_writer()
+        Database._write_queue.put(WriteRequest(None, None, False, future, job, tables))
+        return future
+
+    @staticmethod
+    def _ensure_writer() -> None:
+        with Database._writer_lock:
+            if Database._writer is None or not Database._writer.is_alive():
+                Database._writer = threading.Thread(target=Database._writer_loop, name="db-writer", daemon=True)
+                Database._writer.start()
+
+    @staticmethod
+    def _writer_loop() -> None:
+        """書き込みスレッド本体（待っている書き込みをまとめて取り出してコミットする）"""
+        while True:
+            batch = [Database._write_queue.get()]
+            while len(batch) < Database.WRITE_BATCH_MAX:
+                try:
+                    batch.append(Database._write_queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                Database._commit_batch(batch)
+            except Exception as e:
+                # 想定外のエラーでも呼び出し側を待たせたままにしない
+                logging.error(f"書き込みスレッドのエラー: {e}")
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+
+    @staticmethod
+    def _commit_batch(batch: List[WriteRequest]) -> None:
+        """書き込みを1トランザクションでコミットし、各Futureに結果を設定する
+
+        SQLエラーになった書き込みがあれば、トランザクションを取り消してその書き込みを除いてやり直す
+        （正常時に書き込みごとのSAVEPOINTを置くと、トリガー付きの大量INSERTが極端に遅くなるため）。
+        ロック競合時は待ち時間を倍にしながらやり直す。
+        """
+        failed: Dict[int, Exception] = {}
+        attempt = 0
+        while True:
+            try:
+                rowcounts = Database._apply_writes(batch, failed)
+                break
+            except _FailedWrite as e:
+                failed[e.index] = e.error
+            except sqlite3.Error as e:
+                if not Database._is_busy(e) or attempt == Database.WRITE_RETRIES:
+                    logging.error(f"書き込みエラー: {e} | 件数: {len(batch)}")
+                    for request in batch:
+                        request.future.set_exception(e)
+                    return
+                time.sleep(Database.WRITE_RETRY_BACKOFF_SECONDS * 2 ** attempt)
+                attempt += 1
+
+        for index, request in enumerate(batch):
+            if index in failed:
+                continue
+            if request.job is not None:
+                Database.bump_generation(*request.tables)
             else:
-                cursor.execute(query)
-            return cursor.fetchall()
-        except sqlite3.Error as e:
-            logging.error(f"SQLエラー: {e} | クエリ: {query} | パラメータ: {params}")
-            raise
-        finally:
-            conn.close()
+                Database._bump_written_table(request.query)
+        for index, request in enumerate(batch):
+            if index in failed:
+                request.future.set_exception(failed[index])
+            else:
+                request.future.set_result(rowcounts[index])
+
+    @staticmethod
+    def _apply_writes(batch: List[WriteRequest], skip: Dict[int, Exception]) -> Dict[int, Any]:
+        """書き込みスレッドの接続で、skip以外の書き込みを1トランザクションで実行する（戻り値は番号→変更行数／jobの戻り値）
+
+        ロック競合以外のSQLエラー（jobはすべての例外）はトランザクションを取り消し、_FailedWriteとして返す。
+        """
+        with Database.connection() as conn:
+            cursor = conn.cursor()
+            rowcounts: Dict[int, Any] = {}
+            try:
+                cursor.execute("BEGIN IMMEDIATE")
+                for index, request in enumerate(batch):
+                    if index in skip:
+                        continue
+                    if request.job is not None:
+                        try:
+                            rowcounts[index] = request.job(cursor)
+                        except Exception as e:
+                            if isinstance(e, sqlite3.Error) and Database._is_busy(e):
+                                raise
+                            logging.error(f"書き込みジョブのエラー: {e} | テーブル: {request.tables}")
+                            raise _FailedWrite(index, e)
+                        continue
+                    started = time.perf_counter()
+                    try:
+                        if request.many:
+                            cursor.executemany(request.query, request.params)
+                        elif request.params:
+                            cursor.execute(request.query, request.params)
+                        else:
+                            cursor.execute(request.query)
+                    except sqlite3.Error as e:
+                        if Database._is_busy(e):
+                            raise
+                        params = f"パラメータ件数: {len(request.params)}" if request.many else f"パラメータ: {request.params}"
+                        logging.error(f"SQLエラー: {e} | クエリ: {request.query} | {params}")
+                        raise _FailedWrite(index, e)
+                    rowcounts[index] = cursor.rowcount
+                    record_query(request.query, started, cursor.rowcount)
+                conn.commit()
+            except (sqlite3.Error, _FailedWrite):
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+            return rowcounts
+
+    @staticmethod
+    def execute_query(query: str, params: Optional[Tuple] = None) -> None:
+        """書き込みスレッドで実行し、コミットされるまで待つ"""
+        Database.submit_write(query, params).result()
+
+    @staticmethod
+    def execute_many(query: str, params_seq: Sequence[Tuple]) -> None:
+        """同じクエリを複数のパラメータで実行し、まとめてコミットする（書き込みスレッドで実行し、コミットまで待つ）"""
+        Database.submit_write(query, params_seq, many=True).result()
+
+    @staticmethod
+    def fetch_data(query: str, params: Optional[Tuple] = None) -> List[Tuple]:
+        started = time.perf_counter()
+        with Database.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                if params:
+                    cursor.execute(query, params)
+                else:
+                    cursor.execute(query)
+                rows = cursor.fetchall()
+                record_query(query, started, len(rows))
+                return rows
+            except sqlite3.Error as e:
+                logging.error(f"SQLエラー: {e} | クエリ: {query} | パラメータ: {params}")
+                raise
+            finally:
+                cursor.close()
+
+    @staticmethod
+    def fetch_many(query: str, params: Optional[Tuple] = None,
+                   size: Optional[int] = None) -> Iterator[List[Tuple]]:
+        """結果をfetchmanyでsize件ずつ返すジェネレータ（全件をメモリに載せない）"""
+        size = size or Database.FETCH_BATCH_SIZE
+        # 呼び出し側の処理時間を含めないよう、SQLiteでの実行・取得時間だけを積算する
+        elapsed = 0.0
+        total_rows = 0
+        started = time.perf_counter()
+        with Database.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                if params:
+                    cursor.execute(query, params)
+                else:
+                    cursor.execute(query)
+                while True:
+                    rows = cursor.fetchmany(size)
+                    elapsed += time.perf_counter() - started
+                    total_rows += len(rows)
+                    if not rows:
+                        break
+                    yield rows
+                    started = time.perf_counter()
+            except sqlite3.Error as e:
+                logging.error(f"SQLエラー: {e} | クエリ: {query} | パラメータ: {params}")
+                raise
+            finally:
+                cursor.close()
+                record("query", normalize_query(query), elapsed, total_rows)
+
+    @staticmethod
+    def fetch_cached(query: str, params: Optional[Tuple] = None,
+                     ttl: Optional[float] = None) -> List[Tuple]:
+        """fetch_dataの結果をキャッシュして返す
+
+        クエリが読むテーブル（FROM/JOIN）のいずれかに書き込みがあるか、
+        ttl秒（省略時はCACHE_TTL_SECONDS）を過ぎるまで同じ結果を返す。
+        結果のリストは共有されるため変更しないこと。CACHE_MAX_RESULT_ROWS行を超える結果はキャッシュしない。
+        """
+        ttl = Database.CACHE_TTL_SECONDS if ttl is None else ttl
+        key = (Database.DB_FILE, query, params)
+        tables = {name.lower() for name in Database._READ_TABLE_RE.findall(query)} | {"*"}
+        now = time.monotonic()
+        # read_snapshotの中では、スナップショットを開いた時点の世代番号で照合・保存する
+        # （その後の書き込みで世代が進んでいても、読むのは古い時点のデータのため）
+        snapshot_generations = getattr(Database._local, "snapshot_generations", None)
+        with Database._cache_lock:
+            current = Database._generations if snapshot_generations is None else snapshot_generations
+            generations = {table: current.get(table, 0) for table in tables}
+            entry = Database._cache.get(key)
+            if entry is not None:
+                cached_at, cached_generations, rows = entry
+                if cached_generations == generations and now - cached_at < ttl:
+                    Database._cache.move_to_end(key)
+                    return rows
+                del Database._cache[key]
+                Database._cache_rows -= len(rows)
+
+        rows = Database.fetch_data(query, params)
+        if len(rows) > Database.CACHE_MAX_RESULT_ROWS:
+            return rows
+        with Database._cache_lock:
+            previous = Database._cache.pop(key, None)
+            if previous is not None:
+                Database._cache_rows -= len(previous[2])
+            Database._cache[key] = (now, generations, rows)
+            Database._cache_rows += len(rows)
+            while (len(Database._cache) > Database.CACHE_MAX_ENTRIES
+                   or Database._cache_rows > Database.CACHE_MAX_ROWS):
+                _, (_, _, evicted) = Database._cache.popitem(last=False)
+                Database._cache_rows -= len(evicted)
+        return rows
+
+
+    @staticmethod
+    @contextmanager
+    def read_snapshot() -> Iterator[sqlite3.Connection]:
+        """接続を借りて読み取りトランザクションを開く（中のクエリはすべて同じ接続・同じ時点のデータを読む）
+
+        すでにトランザクション中なら新たには開かない。中で書き込みは行わないこと。
+        中のfetch_cachedは開いた時点の世代番号をキャッシュのキーにする。
+        """
+        with Database.connection() as conn:
+            if conn.in_transaction:
+                yield conn
+                return
+            # BEGINより前に世代番号を写す（写した後にコミットされた書き込みが見えても、世代が古いだけで安全側）
+            with Database._cache_lock:
+                Database._local.snapshot_generations = dict(Database._generations)
+            conn.execute("BEGIN")
+            try:
+                yield conn
+            finally:
+                Database._local.snapshot_generations = None
+                conn.commit()
+
+    @staticmethod
+    def _run_in_snapshot(call: Callable[[], T]) -> T:
+        with Database.read_snapshot():
+            return call()
+
+    @staticmethod
+    def _get_batch_executor() -> ThreadPoolExecutor:
+        with Database._batch_executor_lock:
+            if Database._batch_executor is None:
+                Database._batch_executor = ThreadPoolExecutor(
+                    max_workers=Database.BATCH_WORKERS, thread_name_prefix="db-batch"
+                )
+            return Database._batch_executor
+
+    @staticmethod
+    def fetch_batch(calls: Dict[str, Callable[[], T]], parallel: bool = False) -> Dict[str, T]:
+        """名前付きのクエリ（引数なしの関数。queries.pyの関数をlambdaで包む等）をまとめて実行し、{名前: 結果} を返す
+
+        通常は現在のスレッドの接続で1つの読み取りトランザクションを開き、すべてのクエリが同じ時点のデータを読む。
+        parallel=Trueなら、互いに独立した重い集計をスレッドプールで並行に実行する
+        （各スレッドが自分の接続・トランザクションで読むため、クエリ間で読む時点はそろわない）。
+        """
+        if not parallel or len(calls) < 2:
+            with Database.read_snapshot():
+                return {name: call() for name, call in calls.items()}
+        executor = Database._get_batch_executor()
+        futures = {name: executor.submit(Database._run_in_snapshot, call) for name, call in calls.items()}
+        return {name: future.result() for name, future in futures.items()}
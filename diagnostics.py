@@ -0,0 +1,53 @@
+# diagnostics.py
+# 診断ページ（メニューには表示せず、URLに ?diagnostics=1 を付けたときだけ選択できる）
+from datetime import datetime
+
+import pandas as pd
+import streamlit as st
+import instrumentation
+
+
+def _summary_frame(kind: str) -> pd.DataFrame:
+    df = pd.DataFrame(instrumentation.summary(kind))
+    if df.empty:
+        return df
+    return df.rename(columns={
+        "name": "名前", "count": "回数", "p50_ms": "p50 (ms)", "p90_ms": "p90 (ms)",
+        "p99_ms": "p99 (ms)", "max_ms": "最大 (ms)", "avg_rows": "平均行数",
+    }).round(2)
+
+
+def diagnostics_page():
+    st.header("診断")
+    st.caption(f"遅いクエリのしきい値: {instrumentation.SLOW_QUERY_THRESHOLD_MS:.0f} ms "
+               f"（環境変数 SLOW_QUERY_THRESHOLD_MS で変更）")
+
+    st.subheader("ページ処理の所要時間")
+    stages = _summary_frame("stage")
+    if stages.empty:
+        st.info("まだ記録がありません。")
+    else:
+        st.dataframe(stages, use_container_width=True, hide_index=True)
+
+    st.subheader("クエリの所要時間")
+    queries = _summary_frame("query")
+    if queries.empty:
+        st.info("まだ記録がありません。")
+    else:
+        st.dataframe(queries, use_container_width=True, hide_index=True)
+
+    st.subheader("遅いクエリ")
+    slow = instrumentation.slow_queries()
+    if slow:
+        st.dataframe(pd.DataFrame([{
+            "日時": datetime.fromtimestamp(t.recorded_at).strftime("%Y-%m-%d %H:%M:%S"),
+            "所要時間 (ms)": round(t.seconds * 1000, 2),
+            "行数": t.rows,
+            "クエリ": t.name,
+        } for t in slow]), use_container_width=True, hide_index=True)
+    else:
+        st.info("しきい値を超えたクエリはありません。")
+
+    if st.button("記録をクリア"):
+        instrumentation.clear()
+        st.success("記録をクリアしました！")
@@ -0,0 +1,136 @@
+# forecasting.py
+# 月次の売上・原価・販管費・利益の見通し（傾向＋季節性の線形モデル）
+# 複数の系列（案件・タグごと等）は同じ説明変数で1回の最小二乗法にまとめて当てはめる（系列ごとのループを書かない）
+# 結果は元データの世代番号ごとにキャッシュし、データが変わらない限り再計算しない
+from functools import lru_cache
+from statistics import NormalDist
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from database import Database
+from periods import ALL_PERIOD
+from queries import profit_by_month, sales_by_group_and_month
+
+FORECAST_MONTHS = 6
+SEASON_LENGTH = 12
+# 季節性（月ごとの効果）を当てはめるのに必要な月数（2年分に満たなければ傾向だけ）
+MIN_SEASONAL_MONTHS = 2 * SEASON_LENGTH
+INTERVAL_LEVEL = 0.95
+SALES_GROUP_COLUMNS = ("project", "tag")
+PROFIT_SERIES = ("売上", "原価", "販管費", "利益")
+
+
+class Forecast(NamedTuple):
+    names: List[str]  # 系列名（k件）
+    months: List[str]  # 見通しの月（h件、YYYY-MM）
+    point: np.ndarray  # 見通し（k×h、円）
+    lower: np.ndarray  # 予測区間の下限（k×h）
+    upper: np.ndarray  # 予測区間の上限（k×h）
+
+
+def _design(ordinals: np.ndarray, origin: int, seasonal: bool) -> np.ndarray:
+    """説明変数の行列（切片・月の通し番号・季節ダミー11列）"""
+    t = (ordinals - origin).astype("float64")
+    columns = [np.ones_like(t), t]
+    if seasonal:
+        # 1月を基準とした月ごとのダミー変数
+        month_of_year = ordinals % SEASON_LENGTH
+        columns.extend((month_of_year == m).astype("float64") for m in range(1, SEASON_LENGTH))
+    return np.column_stack(columns)
+
+
+def fit_forecast(first_month: str, values: np.ndarray, horizon: int = FORECAST_MONTHS,
+                 level: float = INTERVAL_LEVEL, nonnegative=False
+                 ) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]:
+    """k×Tの月次系列（first_monthから連続するT か月）の先horizon か月の見通しと予測区間を返す
+
+    全系列に同じ説明変数を使うので、係数は1回のlstsqでまとめて求める。
+    予測区間は残差の標準偏差と説明変数のてこ比から、正規分布で近似する。
+    """
+    values = np.atleast_2d(np.asarray(values, dtype="float64"))
+    start = pd.Period(first_month, freq="M")
+    n_months = values.shape[1]
+    history = start.ordinal + np.arange(n_months)
+    future_periods = pd.period_range(start + n_months, periods=horizon, freq="M")
+    future = future_periods.asi8
+
+    seasonal = n_months >= MIN_SEASONAL_MONTHS
+    x = _design(history, start.ordinal, seasonal)
+    x_future = _design(future, start.ordinal, seasonal)
+
+    # 係数（p×k）を全系列まとめて求める
+    coefficients, _, rank, _ = np.linalg.lstsq(x, values.T, rcond=None)
+    point = (x_future @ coefficients).T
+
+    # 残差の標準偏差（系列ごと）と、見通しの月ごとのてこ比（全系列共通）
+    residuals = values.T - x @ coefficients
+    dof = max(n_months - rank, 1)
+    sigma = np.sqrt((residuals ** 2).sum(axis=0) / dof)
+    leverage = np.einsum("ij,jk,ik->i", x_future, np.linalg.pinv(x.T @ x), x_future)
+    z = NormalDist().inv_cdf(0.5 + level / 2)
+    width = z * sigma[:, None] * np.sqrt(1 + leverage)[None, :]
+
+    lower, upper = point - width, point + width
+    # nonnegativeは全系列共通のbool、または系列ごとのboolの配列
+    clip = np.broadcast_to(np.asarray(nonnegative, dtype=bool), (values.shape[0],))[:, None]
+    point, lower, upper = (np.where(clip, np.clip(a, 0, None), a) for a in (point, lower, upper))
+    return list(future_periods.strftime("%Y-%m")), point, lower, upper
+
+
+def _month_matrix(keys: Sequence, months: Sequence[str], amounts: Sequence) -> Tuple[List, str, np.ndarray]:
+    """(系列, 月, 金額) の行をk×T の行列にする（最初の月から連続する月、データのない月は0）"""
+    key_codes, names = pd.factorize(pd.Series(list(keys)))
+    ordinals = pd.PeriodIndex(list(months), freq="M").asi8
+    first = ordinals.min()
+    matrix = np.zeros((len(names), ordinals.max() - first + 1))
+    np.add.at(matrix, (key_codes, ordinals - first), np.asarray(amounts, dtype="float64"))
+    return list(names), str(pd.Period(ordinal=first, freq="M")), matrix
+
+
+def _forecast_matrix(names: List, first_month: str, matrix: np.ndarray, horizon: int, nonnegative) -> Forecast:
+    months, point, lower, upper = fit_forecast(first_month, matrix, horizon, nonnegative=nonnegative)
+    point, lower, upper = (np.rint(a).astype("int64") for a in (point, lower, upper))
+    return Forecast(names, months, point, lower, upper)
+
+
+@lru_cache(maxsize=32)
+def _cached_profit_forecast(owner: str, horizon: int, generation: Tuple[int, ...]) -> Optional[Forecast]:
+    rows = profit_by_month(owner, ALL_PERIOD)
+    if not rows:
+        return None
+    months, revenues, costs, sg_a_costs, profits = zip(*rows)
+    names = list(PROFIT_SERIES)
+    _, first_month, matrix = _month_matrix(
+        np.repeat(names, len(months)), months * len(names), revenues + costs + sg_a_costs + profits
+    )
+    # 売上・原価・販管費は0未満にならない（利益は負になりうる）
+    nonnegative = np.array([True, True, True, False])
+    return _forecast_matrix(names, first_month, matrix, horizon, nonnegative)
+
+
+@lru_cache(maxsize=32)
+def _cached_sales_forecast(owner: str, column: str, horizon: int,
+                           generation: Tuple[int, ...]) -> Optional[Forecast]:
+    rows = sales_by_group_and_month(owner, column, ALL_PERIOD)
+    if not rows:
+        return None
+    keys, months, amounts = zip(*rows)
+    names, first_month, matrix = _month_matrix(keys, months, amounts)
+    return _forecast_matrix(names, first_month, matrix, horizon, nonnegative=True)
+
+
+def profit_forecast(owner: str, horizon: int = FORECAST_MONTHS) -> Optional[Forecast]:
+    """売上・原価・販管費・利益（PROFIT_SERIESの順）の見通し（データがなければNone）
+
+    全期間の月次損益から、最新の月に続くhorizon か月を見積もる。結果は共有されるため変更しないこと。
+    """
+    return _cached_profit_forecast(owner, horizon, Database.generation("profits"))
+
+
+def sales_forecast(owner: str, column: str, horizon: int = FORECAST_MONTHS) -> Optional[Forecast]:
+    """案件（column="project"）またはタグ（column="tag"）ごとの売上の見通し（データがなければNone）"""
+    if column not in SALES_GROUP_COLUMNS:
+        raise ValueError(f"不明な列: {column}")
+    return _cached_sales_forecast(owner, column, horizon, Database.generation("sales", "tags"))
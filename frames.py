@@ -0,0 +1,53 @@
+# frames.py
+# クエリ結果から列の型をそろえたDataFrameを作る（行のタプルから列ごとに作る）
+# 案件名・タグ・費目はカテゴリ型、日付はdatetime64（読み込み時に1回だけ解析）、整数は値に合う最小の型にする
+# セッションごとに持つDataFrameのメモリが減り、文字列のグループ化は整数コードのグループ化になる
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from database import Database
+
+CATEGORY = "category"  # 値の種類が少ない文字列（案件名・タグ・費目）
+DATE = "date"  # YYYY-MM-DD の文字列 → datetime64（解釈できない値はNaT）
+INTEGER = "integer"  # 整数（金額は円）→ int8〜int64のうち値が収まる最小の型
+TEXT = "text"  # そのままの文字列
+COLUMN_KINDS = (CATEGORY, DATE, INTEGER, TEXT)
+
+# 列の指定（[(列名, 種類), ...]、クエリのSELECTの順）
+ColumnSpec = Sequence[Tuple[str, str]]
+
+
+def _typed_column(values: list, kind: str):
+    if kind == CATEGORY:
+        return pd.Categorical(np.asarray(values, dtype=object))
+    if kind == DATE:
+        # 同じ日付が多いため、異なる値だけを1回ずつ解析して行に割り当てる
+        codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+        parsed = pd.to_datetime(uniques, format="%Y-%m-%d", errors="coerce")
+        return parsed.take(codes, allow_fill=True, fill_value=pd.NaT)  # NULL（コード-1）はNaT
+    if kind == INTEGER:
+        # NULLを含む列はfloat64のまま
+        return pd.to_numeric(np.asarray(values), downcast="integer")
+    if kind == TEXT:
+        return np.asarray(values, dtype=object)
+    raise ValueError(f"不明な列の種類: {kind}")
+
+
+def frame_from_rows(rows: List[Tuple], columns: ColumnSpec) -> pd.DataFrame:
+    """行のタプルのリストを、columnsの型のDataFrameにする
+
+    INTEGERの列は小さい型になるため、列どうしの足し算など桁あふれしうる計算は先にastype("int64")すること
+    （sum()はint64で集計される）。
+    """
+    if rows and len(rows[0]) != len(columns):
+        raise ValueError(f"列の数が一致しません: 結果 {len(rows[0])} 列, 指定 {len(columns)} 列")
+    return pd.DataFrame({
+        name: _typed_column([row[i] for row in rows], kind) for i, (name, kind) in enumerate(columns)
+    })
+
+
+def load_frame(query: str, params: Optional[Tuple], columns: ColumnSpec) -> pd.DataFrame:
+    """クエリ結果（Database.fetch_cachedでキャッシュ）を、columnsの型のDataFrameにして返す"""
+    return frame_from_rows(Database.fetch_cached(query, params), columns)
@@ -0,0 +1,49 @@
+# home.py
+# ホーム（ログイン後の最初の画面）：売上・原価・販管費・利益・資金残高の主要指標を1回のクエリで表示する
+import streamlit as st
+from money import THOUSAND_YEN, from_yen
+from queries import kpi_summary
+from instrumentation import stage
+
+
+def home_page():
+    st.header("ホーム")
+    owner = st.session_state["username"]
+    period = st.session_state["period"]
+
+    with stage("home", "kpi"):
+        kpi = kpi_summary(owner, period)
+
+    # 期間の合計（千円単位、小数点切り捨て）
+    revenue, cost, sg_a_cost, target = from_yen(
+        [kpi.revenue, kpi.cost, kpi.sg_a_cost, kpi.target_revenue], THOUSAND_YEN
+    )
+    profit = revenue - cost - sg_a_cost
+    st.subheader("選択した期間の合計")
+    col1, col2, col3, col4, col5 = st.columns(5)
+    col1.metric("総売上", f"{revenue:,} 千円", f"目標との差 {revenue - target:+,} 千円")
+    col2.metric("総原価", f"{cost:,} 千円")
+    col3.metric("総販管費", f"{sg_a_cost:,} 千円")
+    col4.metric("営業利益", f"{profit:,} 千円")
+    col5.metric(
+        "資金残高", f"{kpi.cash_balance:,} 円",
+        f"{kpi.cash_net:+,} 円（{kpi.cash_month}）" if kpi.cash_month else None
+    )
+    if target:
+        st.progress(min(max(revenue / target, 0.0), 1.0), text=f"目標売上 {target:,} 千円の {revenue / target:.0%}")
+
+    # 最新の月の実績と前月比
+    if kpi.latest_month is None:
+        st.info("選択した期間の売上・原価・販管費データがありません。")
+        return
+    latest = from_yen([kpi.latest_revenue, kpi.latest_cost, kpi.latest_sg_a_cost], THOUSAND_YEN)
+    previous = from_yen([kpi.previous_revenue, kpi.previous_cost, kpi.previous_sg_a_cost], THOUSAND_YEN)
+    latest_profit = latest[0] - latest[1] - latest[2]
+    previous_profit = previous[0] - previous[1] - previous[2]
+    st.subheader(f"{kpi.latest_month} の実績（前月比）")
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("売上", f"{latest[0]:,} 千円", f"{latest[0] - previous[0]:+,} 千円")
+    # 原価・販管費は増えると悪化なので色を反転する
+    col2.metric("原価", f"{latest[1]:,} 千円", f"{latest[1] - previous[1]:+,} 千円", delta_color="inverse")
+    col3.metric("販管費", f"{latest[2]:,} 千円", f"{latest[2] - previous[2]:+,} 千円", delta_color="inverse")
+    col4.metric("営業利益", f"{latest_profit:,} 千円", f"{latest_profit - previous_profit:+,} 千円")
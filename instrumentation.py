@@ -0,0 +1,108 @@
+# instrumentation.py
+# クエリ・ページ処理の所要時間の記録と、遅いクエリのログ
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+# この時間（ミリ秒）以上かかったクエリを遅いクエリとして記録する
+SLOW_QUERY_THRESHOLD_MS = float(os.environ.get("SLOW_QUERY_THRESHOLD_MS", "200"))
+# 遅いクエリのログファイル（未設定なら標準エラー出力のみ）
+SLOW_QUERY_LOG = os.environ.get("SLOW_QUERY_LOG")
+MAX_RECORDS = 5000
+MAX_SLOW_QUERIES = 200
+
+slow_query_logger = logging.getLogger("slow_query")
+slow_query_logger.setLevel(logging.WARNING)
+if SLOW_QUERY_LOG:
+    _handler = logging.FileHandler(SLOW_QUERY_LOG, encoding="utf-8")
+    _handler.setFormatter(logging.Formatter("%(asctime)s - %(message)s"))
+    slow_query_logger.addHandler(_handler)
+
+
+class Timing(NamedTuple):
+    kind: str  # "query" または "stage"
+    name: str
+    seconds: float
+    rows: Optional[int]
+    recorded_at: float
+
+
+_records: "deque[Timing]" = deque(maxlen=MAX_RECORDS)
+_slow_queries: "deque[Timing]" = deque(maxlen=MAX_SLOW_QUERIES)
+_lock = threading.Lock()
+
+
+def normalize_query(query: str) -> str:
+    """空白をまとめ、長いクエリは切り詰めて集計用の名前にする"""
+    text = re.sub(r"\s+", " ", query).strip()
+    return text if len(text) <= 160 else text[:157] + "..."
+
+
+def record(kind: str, name: str, seconds: float, rows: Optional[int] = None) -> None:
+    timing = Timing(kind, name, seconds, rows, time.time())
+    with _lock:
+        _records.append(timing)
+        if kind == "query" and seconds * 1000 >= SLOW_QUERY_THRESHOLD_MS:
+            _slow_queries.append(timing)
+    if kind == "query" and seconds * 1000 >= SLOW_QUERY_THRESHOLD_MS:
+        slow_query_logger.warning(f"遅いクエリ: {seconds * 1000:.1f} ms | 行数: {rows} | クエリ: {name}")
+
+
+def record_query(query: str, started: float, rows: Optional[int] = None) -> None:
+    """time.perf_counter()で取った開始時刻からのクエリ時間を記録"""
+    record("query", normalize_query(query), time.perf_counter() - started, rows)
+
+
+@contextmanager
+def stage(page: str, name: str) -> Iterator[None]:
+    """ページ内の処理段階（クエリ・集計・グラフ描画・PowerPoint生成など）の時間を記録"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record("stage", f"{page}.{name}", time.perf_counter() - started)
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def summary(kind: str) -> List[Dict]:
+    """名前ごとの件数とパーセンタイル（ミリ秒）を、p90の大きい順に返す"""
+    with _lock:
+        records = [r for r in _records if r.kind == kind]
+    grouped: Dict[str, List[Timing]] = {}
+    for r in records:
+        grouped.setdefault(r.name, []).append(r)
+    rows = []
+    for name, timings in grouped.items():
+        values = sorted(t.seconds * 1000 for t in timings)
+        row_counts = [t.rows for t in timings if t.rows is not None]
+        rows.append({
+            "name": name,
+            "count": len(values),
+            "p50_ms": _percentile(values, 0.5),
+            "p90_ms": _percentile(values, 0.9),
+            "p99_ms": _percentile(values, 0.99),
+            "max_ms": values[-1],
+            "avg_rows": sum(row_counts) / len(row_counts) if row_counts else None,
+        })
+    return sorted(rows, key=lambda r: r["p90_ms"], reverse=True)
+
+
+def slow_queries() -> List[Timing]:
+    """記録した遅いクエリ（新しい順）"""
+    with _lock:
+        return list(reversed(_slow_queries))
+
+
+def clear() -> None:
+    with _lock:
+        _records.clear()
+        _slow_queries.clear()
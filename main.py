@@ -1,16 +1,8 @@
-# これはサンプルの Python スクリプトです。
+# main.py
+# ベンチマークの実行用エントリーポイント（アプリ本体は `streamlit run dashboard.py` で起動）
+# 例: python main.py --rows 100000 --output bench_output.json
+from benchmark import main
 
-# ⌃R を押して実行するか、ご自身のコードに置き換えてください。
-# ⇧ を2回押す を押すと、クラス/ファイル/ツールウィンドウ/アクション/設定を検索します。
 
-
-def print_hi(name):
-    # スクリプトをデバッグするには以下のコード行でブレークポイントを使用してください。
-    print(f'Hi, {name}')  # ⌘F8を押すとブレークポイントを切り替えます。
-
-
-# ガター内の緑色のボタンを押すとスクリプトを実行します。
 if __name__ == '__main__':
-    print_hi('PyCharm')
-
-# PyCharm のヘルプは https://www.jetbrains.com/help/pycharm/ を参照してください
+    main()
@@ -0,0 +1,134 @@
+# management_report.py
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+import streamlit as st
+from database import Database
+from instrumentation import stage
+from periods import Period
+from report_sections import SECTIONS, build_section
+from reports import PPTX_MIME, EXPORT_MODES, new_presentation, add_slides, presentation_to_bytes
+
+# 全セッションで共有するワーカープロセスプール（初回のレポート作成時に起動）
+_executor = None
+_executor_lock = threading.Lock()
+# 作成中の進捗を画面に反映する間隔（秒）
+PROGRESS_POLL_SECONDS = 1
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = min(len(SECTIONS), os.cpu_count() or 1)
+            # Streamlitのスレッドを複製しないようにspawnでワーカーを起動
+            _executor = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _executor
+
+
+def _discard_executor(executor: ProcessPoolExecutor) -> None:
+    """ワーカーが異常終了して使えなくなったプールを捨てる（次の_get_executorで作り直す）"""
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False)
+
+
+class ReportJob:
+    """バックグラウンドで作成中の経営レポート（セクションごとのFutureを保持）"""
+
+    def __init__(self, mode: str, owner: str, period: Period):
+        self.mode = mode
+        self.owner = owner
+        self.period = period
+        self.started_at = datetime.now()
+        executor = _get_executor()
+        try:
+            self.futures = self._submit(executor)
+        except BrokenProcessPool:
+            # 以前のレポートでワーカーが異常終了したプールは使えないため、作り直して投入し直す
+            _discard_executor(executor)
+            self.futures = self._submit(_get_executor())
+        self._pptx = None
+
+    def _submit(self, executor: ProcessPoolExecutor):
+        db_file = os.path.abspath(Database.DB_FILE)
+        return {
+            name: executor.submit(build_section, name, self.mode, db_file, self.owner, self.period)
+            for name in SECTIONS
+        }
+
+    def progress(self) -> float:
+        done = sum(1 for future in self.futures.values() if future.done())
+        return done / len(self.futures)
+
+    def done(self) -> bool:
+        return all(future.done() for future in self.futures.values())
+
+    def errors(self):
+        return {
+            name: future.exception()
+            for name, future in self.futures.items()
+            if future.done() and future.exception() is not None
+        }
+
+    def pptx(self) -> bytes:
+        """全セクションを1つのPowerPointにまとめる（完了後に1度だけ組み立てる）"""
+        if self._pptx is None:
+            with stage("management_report", "assemble"):
+                ppt = new_presentation()
+                for name in SECTIONS:
+                    add_slides(ppt, self.futures[name].result())
+                self._pptx = presentation_to_bytes(ppt)
+        return self._pptx
+
+
+@st.fragment(run_every=PROGRESS_POLL_SECONDS)
+def _report_progress(job: ReportJob):
+    """作成中の進捗（この部分だけを定期的に再実行し、完了したらページ全体を再実行して結果を表示する）"""
+    st.progress(job.progress(), text=f"{int(job.progress() * 100)}% 完了")
+    if job.done():
+        st.rerun()
+
+
+def management_report_page():
+    st.header("経営レポート")
+    st.write("売上・原価・販管費・利益・資金の各セクションを並行して作成し、1つのPowerPointにまとめます。")
+
+    export_mode = st.radio("グラフ形式", EXPORT_MODES, horizontal=True, key="management_report_mode")
+    if st.button("レポートを作成"):
+        st.session_state["management_report_job"] = ReportJob(
+            export_mode, st.session_state["username"], st.session_state["period"]
+        )
+
+    job = st.session_state.get("management_report_job")
+    if job is None:
+        return
+
+    st.caption(f"作成開始: {job.started_at:%Y-%m-%d %H:%M:%S}")
+    if not job.done():
+        # 作成中も他のページは操作できる
+        _report_progress(job)
+        return
+    st.progress(1.0, text="100% 完了")
+
+    errors = job.errors()
+    if errors:
+        for name, error in errors.items():
+            st.error(f"{name}セクションの作成に失敗しました: {error}")
+        return
+
+    st.success("レポートの作成が完了しました！")
+    st.download_button(
+        label="PowerPointをダウンロード",
+        data=job.pptx(),
+        file_name=f"management_report_{job.started_at:%Y%m%d_%H%M%S}.pptx",
+        mime=PPTX_MIME
+    )
@@ -0,0 +1,31 @@
+# money.py
+# 金額の単位変換（DBには金額をすべて整数の円で保存する）
+# スカラー・リスト・NumPy配列・pandasのSeriesをまとめて変換する（1件ずつのループを書かない）
+import numpy as np
+import pandas as pd
+
+YEN = 1
+THOUSAND_YEN = 1000  # 千円
+
+
+def _like(values, result: np.ndarray):
+    """変換結果を入力と同じ種類（スカラー・リスト・Series・配列）で返す"""
+    if isinstance(values, pd.Series):
+        return pd.Series(result, index=values.index, name=values.name)
+    if result.ndim == 0:
+        return int(result)
+    if isinstance(values, (list, tuple)):
+        return result.tolist()
+    return result
+
+
+def to_yen(values, unit: int = YEN):
+    """unit円単位の金額を整数の円に変換する（1円未満は四捨五入）"""
+    amounts = np.asarray(values, dtype="float64") * unit
+    return _like(values, np.rint(amounts).astype("int64"))
+
+
+def from_yen(values, unit: int = THOUSAND_YEN):
+    """整数の円をunit円単位に変換する（小数点以下切り捨て）"""
+    amounts = np.asarray(values, dtype="int64")
+    return _like(values, np.floor_divide(amounts, unit))
@@ -0,0 +1,78 @@
+# periods.py
+# 集計期間（サイドバーで選択し、各ページのクエリに date BETWEEN ? AND ? として渡す）
+# 期間は月単位（開始月の1日〜終了月の末日）。月次損益（profits）や資金（cashflow）の月とそのまま比較できる
+import calendar
+import re
+from datetime import date
+from typing import List, NamedTuple, Optional
+
+FISCAL_YEAR_START_MONTH = 4  # 年度は4月始まり
+
+PERIOD_ALL = "全期間"
+PERIOD_THIS_MONTH = "今月"
+PERIOD_THIS_QUARTER = "今四半期"
+PERIOD_THIS_FISCAL_YEAR = "今年度"
+PERIOD_CUSTOM = "月を指定"
+PERIOD_KINDS: List[str] = [PERIOD_ALL, PERIOD_THIS_MONTH, PERIOD_THIS_QUARTER, PERIOD_THIS_FISCAL_YEAR, PERIOD_CUSTOM]
+
+_MONTH_RE = re.compile(r"^\s*(\d{4})\s*[-/年.]?\s*(\d{1,2})\s*月?\s*$")
+
+
+class Period(NamedTuple):
+    start: str  # YYYY-MM-DD（両端を含む）
+    end: str
+
+    @property
+    def start_month(self) -> str:
+        return self.start[:7]
+
+    @property
+    def end_month(self) -> str:
+        return self.end[:7]
+
+
+# 全期間（すべての日付・月を含む範囲。クエリの形をそろえるため条件は省かない）
+ALL_PERIOD = Period("0000-01-01", "9999-12-31")
+
+
+def month_range(start_year: int, start_month: int, months: int) -> Period:
+    """start_year年start_month月からmonthsか月分の期間"""
+    index = start_year * 12 + start_month - 1 + months - 1
+    end_year, end_month = divmod(index, 12)
+    end_month += 1
+    last_day = calendar.monthrange(end_year, end_month)[1]
+    return Period(f"{start_year:04d}-{start_month:02d}-01", f"{end_year:04d}-{end_month:02d}-{last_day:02d}")
+
+
+def period_for(kind: str, today: Optional[date] = None) -> Period:
+    """今月・今四半期・今年度の期間を返す（四半期は年度の開始月から3か月ごと）"""
+    today = today or date.today()
+    if kind == PERIOD_THIS_MONTH:
+        return month_range(today.year, today.month, 1)
+    if kind in (PERIOD_THIS_QUARTER, PERIOD_THIS_FISCAL_YEAR):
+        # 年度の開始月から数えた今月の位置（0〜11）
+        offset = (today.month - FISCAL_YEAR_START_MONTH) % 12
+        length = 3 if kind == PERIOD_THIS_QUARTER else 12
+        months_back = offset % length
+        index = today.year * 12 + today.month - 1 - months_back
+        return month_range(index // 12, index % 12 + 1, length)
+    return ALL_PERIOD
+
+
+def custom_period(start: date, end: date) -> Period:
+    """開始日・終了日を含む月の範囲（開始月の1日〜終了月の末日）"""
+    if end < start:
+        start, end = end, start
+    months = (end.year - start.year) * 12 + end.month - start.month + 1
+    return month_range(start.year, start.month, months)
+
+
+def normalize_month(text: str) -> Optional[str]:
+    """「2023-1」「2023/01」「2023年1月」「202301」などをYYYY-MMにそろえる（解釈できなければNone）"""
+    match = _MONTH_RE.match(str(text))
+    if not match:
+        return None
+    year, month = int(match.group(1)), int(match.group(2))
+    if not 1 <= month <= 12:
+        return None
+    return f"{year:04d}-{month:02d}"
@@ -1,51 +1,97 @@
 import streamlit as st
 import pandas as pd
-import math
-import os
-import matplotlib.pyplot as plt
+import altair as alt
 from database import Database
-from pptx import Presentation
-from pptx.util import Inches
+from money import THOUSAND_YEN, from_yen
+from queries import profit_totals, profit_by_month
+from charts import profit_monthly_chart
+from forecasting import FORECAST_MONTHS, PROFIT_SERIES, profit_forecast, sales_forecast
+from instrumentation import stage
+from reports import (
+    PPTX_MIME, EXPORT_MODES, EXPORT_NATIVE,
+    new_presentation, add_picture_slide, add_chart_slide, presentation_to_bytes
+)
 
-# チャート画像を保存するためのディレクトリを作成
-output_dir = os.path.abspath("output_images")
-os.makedirs(output_dir, exist_ok=True)
 
+def generate_profit_pptx(monthly_chart):
+    """PowerPointファイルを生成（バイト列で返す）"""
+    ppt = new_presentation()
 
-def save_matplotlib_chart(fig, filename):
-    """Matplotlibのグラフを画像として保存"""
-    filepath = os.path.join(output_dir, filename)
-    fig.savefig(filepath, format="png", dpi=300, bbox_inches="tight")
-    plt.close(fig)
-    return filepath
+    # スライド1: 月毎利益
+    add_picture_slide(ppt, "月毎利益", monthly_chart)
 
+    return presentation_to_bytes(ppt)
 
-def generate_profit_pptx(monthly_chart_path):
-    """PowerPointファイルを生成"""
-    ppt = Presentation()
 
-    # スライド1: 月毎利益
-    slide = ppt.slides.add_slide(ppt.slide_layouts[5])
-    slide.shapes.title.text = "月毎利益"
-    slide.shapes.add_picture(monthly_chart_path, Inches(1), Inches(1.5), width=Inches(6))
+def generate_profit_native_pptx(months, profits):
+    """PowerPointのネイティブグラフでファイルを生成（Matplotlibを使わない、バイト列で返す）"""
+    ppt = new_presentation()
 
-    pptx_file = os.path.join(output_dir, "profit_report.pptx")
-    ppt.save(pptx_file)
-    return pptx_file
+    # スライド1: 月毎利益
+    add_chart_slide(ppt, "月毎利益", "line", months, {"営業利益（千円）": profits})
+
+    return presentation_to_bytes(ppt)
+
+
+def forecast_section(owner, monthly_data):
+    """利益の見通しと、案件・タグごとの売上の見通し（千円単位）"""
+    st.subheader("利益の見通し")
+    horizon = st.slider("見通しの月数", min_value=1, max_value=24, value=FORECAST_MONTHS, key="profit_forecast_months")
+    with stage("profit", "forecast"):
+        forecast = profit_forecast(owner, horizon)
+    if forecast is None:
+        return
+
+    profit_index = PROFIT_SERIES.index("利益")
+    forecast_data = pd.DataFrame({"月": forecast.months})
+    for i, name in enumerate(PROFIT_SERIES):
+        forecast_data[name] = from_yen(forecast.point[i], THOUSAND_YEN)
+    forecast_data["利益（下限）"] = from_yen(forecast.lower[profit_index], THOUSAND_YEN)
+    forecast_data["利益（上限）"] = from_yen(forecast.upper[profit_index], THOUSAND_YEN)
+
+    history = monthly_data[["月", "利益"]].assign(種別="実績")
+    lines = pd.concat([history, forecast_data[["月", "利益"]].assign(種別="見通し")], ignore_index=True)
+    band = alt.Chart(forecast_data).mark_area(opacity=0.2).encode(x="月:O", y="利益（下限）:Q", y2="利益（上限）:Q")
+    line = alt.Chart(lines).mark_line(point=True).encode(
+        x="月:O", y=alt.Y("利益:Q", title="利益（千円）"), color="種別:N", tooltip=["月", "利益", "種別"]
+    )
+    st.altair_chart(band + line, use_container_width=True)
+    st.caption("網掛けは95%予測区間です。2年分以上の実績があれば月ごとの季節性も考慮します。")
+    st.dataframe(forecast_data, hide_index=True)
+
+    # 案件・タグごとの売上の見通し（全系列を1回の計算でまとめて見積もる）
+    st.subheader("売上の見通し（案件・タグ別）")
+    group = st.radio("集計単位", ["案件別", "タグ別"], horizontal=True, key="sales_forecast_group")
+    with stage("profit", "sales_forecast"):
+        sales = sales_forecast(owner, "project" if group == "案件別" else "tag", horizon)
+    if sales is None:
+        return
+    sales_data = pd.DataFrame({
+        "案件名" if group == "案件別" else "タグ": sales.names,
+        "見通し合計": from_yen(sales.point.sum(axis=1), THOUSAND_YEN),
+        "下限合計": from_yen(sales.lower.sum(axis=1), THOUSAND_YEN),
+        "上限合計": from_yen(sales.upper.sum(axis=1), THOUSAND_YEN),
+    }).sort_values("見通し合計", ascending=False)
+    st.caption(f"{sales.months[0]}〜{sales.months[-1]}の合計（千円）。下限・上限は月ごとの予測区間の合計です。")
+    st.dataframe(sales_data, hide_index=True)
 
 
 def profit_management_page():
     st.header("利益管理")
-
-    # 売上、原価、販管費データを取得
-    sales_total = Database.fetch_data("SELECT SUM(revenue) FROM sales")[0][0] or 0
-    cost_total = Database.fetch_data("SELECT SUM(cost) FROM costs")[0][0] or 0
-    sg_a_cost_total = Database.fetch_data("SELECT SUM(amount) FROM sg_a_costs")[0][0] or 0
+    owner = st.session_state["username"]
+    period = st.session_state["period"]
+
+    # 売上、原価、販管費データを月次損益テーブルから取得（1つの読み取りトランザクションで同じ時点のデータを読む）
+    with stage("profit", "aggregate"):
+        results = Database.fetch_batch({
+            "totals": lambda: profit_totals(owner, period),
+            "monthly": lambda: profit_by_month(owner, period),
+        })
+        sales_total, cost_total, sg_a_cost_total = results["totals"]
+        monthly_rows = results["monthly"]
 
     # 営業利益を計算 (千円単位、小数点切り捨て)
-    sales_total = math.floor(sales_total / 1000)
-    cost_total = math.floor(cost_total / 1000)
-    sg_a_cost_total = math.floor(sg_a_cost_total / 1000)
+    sales_total, cost_total, sg_a_cost_total = from_yen([sales_total, cost_total, sg_a_cost_total], THOUSAND_YEN)
     total_profit = sales_total - cost_total - sg_a_cost_total
 
     # 利益情報を表示
@@ -54,57 +100,39 @@ def profit_management_page():
     st.metric("総販管費", f"{sg_a_cost_total:,} 千円")
     st.metric("営業利益", f"{total_profit:,} 千円")
 
-    # 仮の月毎利益データ (ここをデータベースのクエリに変更可能)
-    monthly_data = pd.DataFrame({
-        "月": ["2023-01", "2023-02", "2023-03"],
-        "利益": [total_profit, total_profit * 0.8, total_profit * 1.1]
-    })
-
-    # 月毎利益グラフ（Matplotlib）
-    fig_monthly, ax_monthly = plt.subplots(figsize=(10, 6))
-
-    # 折れ線グラフを描画
-    line, = ax_monthly.plot(
-        monthly_data["月"],
-        monthly_data["利益"],
-        marker="o",
-        linestyle="-",
-        color="blue"
+    # 月毎利益データ (千円単位、小数点切り捨て)
+    monthly_data = pd.DataFrame(monthly_rows, columns=["月", "売上", "原価", "販管費", "利益"])
+    if monthly_data.empty:
+        st.info("選択した期間の売上・原価・販管費データがありません。")
+        return
+    monthly_data["利益"] = (
+        from_yen(monthly_data["売上"], THOUSAND_YEN)
+        - from_yen(monthly_data["原価"], THOUSAND_YEN)
+        - from_yen(monthly_data["販管費"], THOUSAND_YEN)
     )
 
-    # 凡例を手動で設定
-    ax_monthly.legend([line], ["営業利益"], fontsize=12, loc="upper left", frameon=True, shadow=True)
-
-    # グラフのタイトル、ラベル、凡例を設定
-    ax_monthly.set_title(
-        "月毎利益（単位：千円）",
-        fontsize=20, weight="bold", color="darkblue", pad=20
-    )
-    ax_monthly.set_ylabel(
-        "利益（千円）",
-        fontsize=14, labelpad=10, fontweight="bold", color="black"
-    )
-    ax_monthly.set_xlabel(
-        "月次推移",
-        fontsize=14, labelpad=10, fontweight="bold", color="black"
-    )
-    ax_monthly.tick_params(axis="both", which="major", labelsize=12)
-    ax_monthly.grid(True, linestyle="--", alpha=0.5)
-
-    # グラフ画像を保存
-    monthly_chart_path = save_matplotlib_chart(fig_monthly, "monthly_chart.png")
+    # 月毎利益グラフ（Matplotlib、データが変わらなければ描画済みの画像を再利用）
+    with stage("profit", "charts"):
+        monthly_chart = profit_monthly_chart(monthly_data["月"].tolist(), monthly_data["利益"].tolist())
 
     # Streamlitにグラフを表示
-    st.image(monthly_chart_path, caption="月毎利益（単位：千円）", use_container_width=True)
+    st.image(monthly_chart, caption="月毎利益（単位：千円）", use_container_width=True)
+
+    # 見通し（全期間の実績から、最新の月に続く月を見積もる）
+    forecast_section(owner, monthly_data)
 
     # PowerPointエクスポート
     st.subheader("PowerPointエクスポート")
+    export_mode = st.radio("グラフ形式", EXPORT_MODES, horizontal=True, key="profit_export_mode")
     if st.button("PowerPointファイルをダウンロード"):
-        pptx_file = generate_profit_pptx(monthly_chart_path)
-        with open(pptx_file, "rb") as file:
-            st.download_button(
-                label="PowerPointをダウンロード",
-                data=file,
-                file_name="profit_report.pptx",
-                mime="application/vnd.openxmlformats-officedocument.presentationml.presentation"
-            )
+        with stage("profit", "export"):
+            if export_mode == EXPORT_NATIVE:
+                pptx_data = generate_profit_native_pptx(monthly_data["月"].tolist(), monthly_data["利益"].tolist())
+            else:
+                pptx_data = generate_profit_pptx(monthly_chart)
+        st.download_button(
+            label="PowerPointをダウンロード",
+            data=pptx_data,
+            file_name="profit_report.pptx",
+            mime=PPTX_MIME
+        )
@@ -0,0 +1,304 @@
+# queries.py
+# 各ページのグラフ・メトリクス用の集計クエリ（集計はSQLite側で行い、小さな結果だけを返す）
+# ownerはデータの所有ユーザー（ログイン中のユーザー名）で、すべてのクエリをそのユーザーのデータに限定する
+# periodは集計期間で、日付・月の列に BETWEEN ? AND ? として渡す（owner, 日付 の索引で範囲検索する）
+# 金額はすべて整数の円で返す（表示単位への変換はmoney.pyで行う）
+from datetime import date
+from typing import List, NamedTuple, Optional, Tuple
+from database import Database
+from periods import Period
+
+SALES_PAGE_SIZE = 50
+SALES_SEARCH_LIMIT = 20
+UNTAGGED = "タグなし"  # タグ未設定・削除済みタグの売上の集計上の名前
+
+
+def sales_total(owner: str, period: Period) -> int:
+    """総売上（円）"""
+    return Database.fetch_cached("""
+        SELECT COALESCE(SUM(revenue), 0)
+        FROM sales
+        WHERE owner = ? AND date BETWEEN ? AND ?
+    """, (owner, period.start, period.end))[0][0]
+
+
+def sales_by_month(owner: str, period: Period) -> List[Tuple[str, int]]:
+    """月別売上（[(YYYY-MM, 売上), ...]、月の昇順）"""
+    return Database.fetch_cached("""
+        SELECT strftime('%Y-%m', date) AS month, SUM(revenue)
+        FROM sales
+        WHERE owner = ? AND date BETWEEN ? AND ?
+        GROUP BY month
+        ORDER BY month
+    """, (owner, period.start, period.end))
+
+
+def sales_by_tag(owner: str, period: Period) -> List[Tuple[str, int]]:
+    """タグ別売上（[(タグ, 売上), ...]、タグ未設定・削除済みタグの売上は「タグなし」にまとめる）
+
+    tag_idごとに集計してから、集計結果だけをtagsと結合してタグ名を引く。
+    """
+    return Database.fetch_cached(f"""
+        SELECT COALESCE(tags.tag_name, '{UNTAGGED}') AS tag_name, SUM(totals.revenue)
+        FROM (
+            SELECT tag_id, SUM(revenue) AS revenue
+            FROM sales
+            WHERE owner = ? AND month BETWEEN ? AND ?
+            GROUP BY tag_id
+        ) AS totals
+        LEFT JOIN tags ON tags.id = totals.tag_id
+        GROUP BY 1
+        ORDER BY 1
+    """, (owner, period.start_month, period.end_month))
+
+
+def sales_by_group_and_month(owner: str, column: str, period: Period) -> List[Tuple[str, str, int]]:
+    """案件（column="project"）またはタグ（column="tag"）ごとの月別売上（[(案件・タグ, YYYY-MM, 売上), ...]）
+
+    月の生成列を使い、(owner, 案件・tag_id, 月) の索引の順にそのまま集計する。
+    """
+    if column == "project":
+        return Database.fetch_cached("""
+            SELECT project, month, SUM(revenue)
+            FROM sales
+            WHERE owner = ? AND month BETWEEN ? AND ?
+            GROUP BY project, month
+        """, (owner, period.start_month, period.end_month))
+    if column == "tag":
+        return Database.fetch_cached(f"""
+            SELECT COALESCE(tags.tag_name, '{UNTAGGED}') AS tag_name, totals.month, SUM(totals.revenue)
+            FROM (
+                SELECT tag_id, month, SUM(revenue) AS revenue
+                FROM sales
+                WHERE owner = ? AND month BETWEEN ? AND ?
+                GROUP BY tag_id, month
+            ) AS totals
+            LEFT JOIN tags ON tags.id = totals.tag_id
+            GROUP BY 1, 2
+        """, (owner, period.start_month, period.end_month))
+    raise ValueError(f"不明な列: {column}")
+
+
+def profit_totals(owner: str, period: Period) -> Tuple[int, int, int]:
+    """月次損益テーブルから総売上・総原価・総販管費を返す"""
+    row = Database.fetch_cached("""
+        SELECT COALESCE(SUM(revenue), 0), COALESCE(SUM(cost), 0), COALESCE(SUM(sg_a_cost), 0)
+        FROM profits
+        WHERE owner = ? AND date BETWEEN ? AND ?
+    """, (owner, period.start_month, period.end_month))[0]
+    return row[0], row[1], row[2]
+
+
+def profit_by_month(owner: str, period: Period) -> List[Tuple[str, int, int, int, int]]:
+    """月次損益（[(YYYY-MM, 売上, 原価, 販管費, 利益), ...]、月の昇順）"""
+    return Database.fetch_cached("""
+        SELECT date, revenue, cost, sg_a_cost, profit
+        FROM profits
+        WHERE owner = ? AND date BETWEEN ? AND ? AND (revenue != 0 OR cost != 0 OR sg_a_cost != 0)
+        ORDER BY date
+    """, (owner, period.start_month, period.end_month))
+
+
+def target_revenue(owner: str) -> int:
+    """目標売上（円、未登録なら0）"""
+    data = Database.fetch_cached("SELECT amount FROM target_revenue WHERE owner = ?", (owner,))
+    return data[0][0] if data else 0
+
+
+def cost_by_project(owner: str, period: Period) -> List[Tuple[str, int]]:
+    """案件別原価（[(案件名, 原価), ...]）"""
+    return Database.fetch_cached("""
+        SELECT project, SUM(cost)
+        FROM costs
+        WHERE owner = ? AND date BETWEEN ? AND ?
+        GROUP BY project
+        ORDER BY project
+    """, (owner, period.start, period.end))
+
+
+def sg_a_costs_by_category(owner: str, period: Period) -> List[Tuple[str, int]]:
+    """費目別販管費（[(費目, 金額), ...]）"""
+    return Database.fetch_cached("""
+        SELECT category, SUM(amount)
+        FROM sg_a_costs
+        WHERE owner = ? AND date BETWEEN ? AND ?
+        GROUP BY category
+        ORDER BY category
+    """, (owner, period.start, period.end))
+
+
+def cashflow_by_month(owner: str, period: Period) -> List[Tuple[str, int, int]]:
+    """月別の収入・支出（[(月, 収入, 支出), ...]、月の昇順）"""
+    return Database.fetch_cached("""
+        SELECT month, SUM(inflow), SUM(outflow)
+        FROM cashflow
+        WHERE owner = ? AND month BETWEEN ? AND ?
+        GROUP BY month
+        ORDER BY month
+    """, (owner, period.start_month, period.end_month))
+
+
+def cash_opening_balance(owner: str) -> int:
+    """資金の期首残高（円、未登録なら0）"""
+    data = Database.fetch_cached("SELECT amount FROM cash_opening_balance WHERE owner = ?", (owner,))
+    return data[0][0] if data else 0
+
+
+def cash_position(owner: str, period: Period) -> List[Tuple[str, int, int, int, int]]:
+    """月別の収入・支出・収支・月末残高（[(月, 収入, 支出, 収支, 残高), ...]、月の昇順）
+
+    残高は期首残高に全期間の収支をウィンドウ関数で累計したもので、期間外の月も残高に含める。
+    YYYY-MMでない月は並び順が定まらないため除く。
+    """
+    return Database.fetch_cached("""
+        WITH monthly AS (
+            SELECT month, SUM(inflow) AS inflow, SUM(outflow) AS outflow
+            FROM cashflow
+            WHERE owner = ? AND month GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]'
+            GROUP BY month
+        ), balances AS (
+            SELECT month, inflow, outflow, inflow - outflow AS net,
+                   COALESCE((SELECT amount FROM cash_opening_balance WHERE owner = ?), 0)
+                   + SUM(inflow - outflow) OVER (ORDER BY month) AS balance
+            FROM monthly
+        )
+        SELECT month, inflow, outflow, net, balance
+        FROM balances
+        WHERE month BETWEEN ? AND ?
+        ORDER BY month
+    """, (owner, owner, period.start_month, period.end_month))
+
+
+class KpiSummary(NamedTuple):
+    """ホーム画面の主要指標（金額はすべて整数の円）"""
+    revenue: int  # 期間の売上
+    cost: int
+    sg_a_cost: int
+    profit: int  # 営業利益
+    target_revenue: int
+    latest_month: Optional[str]  # 期間内で実績のある最新の月（YYYY-MM、なければNone）
+    latest_revenue: int  # 最新の月の実績
+    latest_cost: int
+    latest_sg_a_cost: int
+    latest_profit: int
+    previous_revenue: int  # 最新の月の前月の実績（前月比に使う）
+    previous_cost: int
+    previous_sg_a_cost: int
+    previous_profit: int
+    cash_balance: int  # 期間の終了月末時点の資金残高（期首残高＋収支の累計）
+    cash_month: Optional[str]  # 資金データのある最新の月（終了月以前）
+    cash_net: int  # その月の収支（残高の前月比）
+
+
+def kpi_summary(owner: str, period: Period) -> KpiSummary:
+    """ホーム画面の主要指標を1回のクエリで返す
+
+    損益は月次損益テーブル（1か月1行）、残高は月別の資金データから計算するため、
+    明細テーブル（sales・costs・sg_a_costs）は読まない。
+    """
+    row = Database.fetch_cached("""
+        WITH monthly AS (
+            SELECT date AS month, revenue, cost, sg_a_cost, profit
+            FROM profits
+            WHERE owner = ? AND date <= ? AND (revenue != 0 OR cost != 0 OR sg_a_cost != 0)
+        ), totals AS (
+            SELECT COALESCE(SUM(revenue), 0) AS revenue, COALESCE(SUM(cost), 0) AS cost,
+                   COALESCE(SUM(sg_a_cost), 0) AS sg_a_cost, COALESCE(SUM(profit), 0) AS profit,
+                   MAX(month) AS latest_month
+            FROM monthly
+            WHERE month >= ?
+        ), latest AS (
+            SELECT monthly.* FROM monthly JOIN totals ON monthly.month = totals.latest_month
+        ), previous AS (
+            SELECT monthly.* FROM monthly JOIN totals
+            ON monthly.month = strftime('%Y-%m', totals.latest_month || '-01', '-1 month')
+        ), cash AS (
+            SELECT month, SUM(inflow - outflow) AS net
+            FROM cashflow
+            WHERE owner = ? AND month <= ? AND month GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]'
+            GROUP BY month
+        )
+        SELECT totals.revenue, totals.cost, totals.sg_a_cost, totals.profit,
+               COALESCE((SELECT amount FROM target_revenue WHERE owner = ?), 0),
+               totals.latest_month,
+               COALESCE(latest.revenue, 0), COALESCE(latest.cost, 0),
+               COALESCE(latest.sg_a_cost, 0), COALESCE(latest.profit, 0),
+               COALESCE(previous.revenue, 0), COALESCE(previous.cost, 0),
+               COALESCE(previous.sg_a_cost, 0), COALESCE(previous.profit, 0),
+               COALESCE((SELECT amount FROM cash_opening_balance WHERE owner = ?), 0)
+               + COALESCE((SELECT SUM(net) FROM cash), 0),
+               (SELECT MAX(month) FROM cash),
+               COALESCE((SELECT net FROM cash ORDER BY month DESC LIMIT 1), 0)
+        FROM totals
+        LEFT JOIN latest ON 1 = 1
+        LEFT JOIN previous ON 1 = 1
+    """, (owner, period.end_month, period.start_month, owner, period.end_month, owner, owner))[0]
+    return KpiSummary(*row)
+
+
+def _glob_prefix(text: str) -> str:
+    """前方一致のGLOBパターン（索引を使える）を作る"""
+    escaped = "".join(f"[{c}]" if c in "*?[" else c for c in text)
+    return f"{escaped}*"
+
+
+def has_sales(owner: str, period: Period) -> bool:
+    return bool(Database.fetch_cached(
+        "SELECT EXISTS (SELECT 1 FROM sales WHERE owner = ? AND date BETWEEN ? AND ?)",
+        (owner, period.start, period.end)
+    )[0][0])
+
+
+def sales_page(owner: str, period: Period, after: Optional[Tuple[str, int]] = None, descending: bool = True,
+               project_prefix: str = "", tag_id: Optional[int] = None,
+               limit: int = SALES_PAGE_SIZE) -> List[Tuple[int, str, str, int, str]]:
+    """売上一覧の1ページ分（[(id, 案件名, タグ, 売上, 日付), ...]）
+
+    after には前ページ最後の行の (日付, id) を渡す（キーセットページング）。
+    """
+    conditions, params = ["sales.owner = ?", "date BETWEEN ? AND ?"], [owner, period.start, period.end]
+    if project_prefix:
+        conditions.append("project GLOB ?")
+        params.append(_glob_prefix(project_prefix))
+    if tag_id is not None:
+        conditions.append("tag_id = ?")
+        params.append(tag_id)
+    if after:
+        conditions.append(f"(date, sales.id) {'<' if descending else '>'} (?, ?)")
+        params.extend(after)
+    order = "DESC" if descending else "ASC"
+    return Database.fetch_cached(f"""
+        SELECT sales.id, project, tags.tag_name, revenue, date
+        FROM sales
+        LEFT JOIN tags ON tags.id = sales.tag_id
+        WHERE {' AND '.join(conditions)}
+        ORDER BY date {order}, sales.id {order}
+        LIMIT ?
+    """, tuple(params) + (limit,))
+
+
+def search_sales(owner: str, period: Period, term: str,
+                 limit: int = SALES_SEARCH_LIMIT) -> List[Tuple[int, str, str, int, str]]:
+    """案件名の前方一致、または日付（YYYY-MM-DD）の一致で売上を検索"""
+    term = term.strip()
+    if not term:
+        return []
+    try:
+        day = date.fromisoformat(term)
+    except ValueError:
+        return Database.fetch_cached("""
+            SELECT sales.id, project, tags.tag_name, revenue, date
+            FROM sales
+            LEFT JOIN tags ON tags.id = sales.tag_id
+            WHERE sales.owner = ? AND project GLOB ? AND date BETWEEN ? AND ?
+            ORDER BY project, date
+            LIMIT ?
+        """, (owner, _glob_prefix(term), period.start, period.end, limit))
+    return Database.fetch_cached("""
+        SELECT sales.id, project, tags.tag_name, revenue, date
+        FROM sales
+        LEFT JOIN tags ON tags.id = sales.tag_id
+        WHERE sales.owner = ? AND date = ? AND date BETWEEN ? AND ?
+        ORDER BY sales.id
+        LIMIT ?
+    """, (owner, day.isoformat(), period.start, period.end, limit))
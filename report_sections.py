@@ -0,0 +1,117 @@
+# report_sections.py
+# 経営レポートの各セクション（売上・原価・販管費・利益・資金）のスライド定義を作る
+# プロセスプールのワーカーで実行するため、Streamlitには依存しない
+from typing import Dict, List
+
+from database import Database
+from money import THOUSAND_YEN, from_yen
+from periods import Period
+from queries import (
+    sales_total, sales_by_month, sales_by_tag, target_revenue,
+    cost_by_project, sg_a_costs_by_category, profit_by_month, cashflow_by_month,
+)
+from reports import EXPORT_NATIVE
+
+
+def _chart_slide(mode: str, title: str, kind: str, categories, series: Dict[str, list],
+                 ylabel: str, render=None) -> dict:
+    """ネイティブグラフ、または描画済み画像のスライド定義を返す"""
+    if not categories:
+        return {"type": "text", "title": title, "text": "まだデータが登録されていません。"}
+    if mode == EXPORT_NATIVE:
+        return {"type": "chart", "title": title, "kind": kind,
+                "categories": list(categories), "series": series}
+    import charts
+    png = render() if render else charts.category_chart(kind, title, categories, series, ylabel)
+    return {"type": "picture", "title": title, "png": png}
+
+
+def sales_section(owner: str, period: Period, mode: str) -> List[dict]:
+    import charts
+    # 売上は千円単位（小数点切り捨て）で表示する
+    target, total = from_yen([target_revenue(owner), sales_total(owner, period)], THOUSAND_YEN)
+    monthly = sales_by_month(owner, period)
+    tags = sales_by_tag(owner, period)
+    months, month_values = [r[0] for r in monthly], from_yen([r[1] for r in monthly], THOUSAND_YEN)
+    tag_names, tag_values = [r[0] for r in tags], from_yen([r[1] for r in tags], THOUSAND_YEN)
+    if not any(tag_values):
+        # 売上が0だけの場合は割合を描けないため、データなしのスライドにする
+        tag_names, tag_values = [], []
+    return [
+        _chart_slide(mode, "目標売上と総売上の比較", "bar", ["目標売上", "総売上"],
+                     {"売上高（千円）": [target, total]}, "売上高（千円）",
+                     render=lambda: charts.sales_bar_chart(target, total)),
+        _chart_slide(mode, "月別総売上", "line", months, {"売上高（千円）": month_values}, "売上高（千円）",
+                     render=lambda: charts.sales_line_chart(months, month_values)),
+        _chart_slide(mode, "タグごとの売上割合", "pie", tag_names, {"売上高（千円）": tag_values}, "売上高（千円）",
+                     render=lambda: charts.sales_pie_chart(tag_names, tag_values)),
+        {"type": "text", "title": "総売上と目標差分",
+         "text": f"総売上: {total:,} 千円\n目標との差分: {total - target:+,} 千円"},
+    ]
+
+
+def cost_section(owner: str, period: Period, mode: str) -> List[dict]:
+    rows = cost_by_project(owner, period)
+    total = sum(r[1] for r in rows)
+    return [
+        _chart_slide(mode, "案件別原価", "bar", [r[0] for r in rows],
+                     {"原価（円）": [r[1] for r in rows]}, "原価（円）"),
+        {"type": "text", "title": "原価データ", "text": f"総原価: {total:,.0f} 円"},
+    ]
+
+
+def sg_a_costs_section(owner: str, period: Period, mode: str) -> List[dict]:
+    rows = sg_a_costs_by_category(owner, period)
+    total = sum(r[1] for r in rows)
+    return [
+        _chart_slide(mode, "費目別販管費", "bar", [r[0] for r in rows],
+                     {"販管費（円）": [r[1] for r in rows]}, "販管費（円）"),
+        {"type": "text", "title": "販管費データ", "text": f"総販管費: {total:,.0f} 円"},
+    ]
+
+
+def profit_section(owner: str, period: Period, mode: str) -> List[dict]:
+    import charts
+    rows = profit_by_month(owner, period)
+    months = [r[0] for r in rows]
+    # 千円単位、小数点切り捨て（利益管理ページと同じ計算）
+    amounts = from_yen([r[1:4] for r in rows], THOUSAND_YEN)
+    profits = [revenue - cost - sg_a_cost for revenue, cost, sg_a_cost in amounts]
+    return [
+        _chart_slide(mode, "月毎利益", "line", months, {"営業利益（千円）": profits}, "利益（千円）",
+                     render=lambda: charts.profit_monthly_chart(months, profits)),
+        {"type": "text", "title": "営業利益",
+         "text": f"営業利益: {sum(profits):,} 千円"},
+    ]
+
+
+def cashflow_section(owner: str, period: Period, mode: str) -> List[dict]:
+    rows = cashflow_by_month(owner, period)
+    total_inflow = sum(r[1] for r in rows)
+    total_outflow = sum(r[2] for r in rows)
+    return [
+        _chart_slide(mode, "月別収支", "bar", [r[0] for r in rows],
+                     {"収入（円）": [r[1] for r in rows], "支出（円）": [r[2] for r in rows]}, "金額（円）"),
+        {"type": "text", "title": "資金データ",
+         "text": (f"収入合計: {total_inflow:,.0f} 円\n支出合計: {total_outflow:,.0f} 円\n"
+                  f"収支: {total_inflow - total_outflow:,.0f} 円")},
+    ]
+
+
+# レポートに含めるセクション（この順番でスライドをつなげる）
+SECTIONS = {
+    "売上": sales_section,
+    "原価": cost_section,
+    "販管費": sg_a_costs_section,
+    "利益": profit_section,
+    "資金": cashflow_section,
+}
+
+
+def build_section(name: str, mode: str, db_file: str, owner: str, period: Period) -> List[dict]:
+    """ワーカープロセスでownerの期間内のデータから1セクション分のスライド定義を作る"""
+    Database.DB_FILE = db_file
+    # ワーカープロセスにはほかのプロセスでの書き込みが世代番号に反映されないため、
+    # 前のレポートで残ったキャッシュ（クエリ結果・予測）を使わずに読み直す
+    Database.bump_generation()
+    return SECTIONS[name](owner, period, mode)
@@ -0,0 +1,118 @@
+# reports.py
+# PowerPointレポート生成の共通処理（ファイルを介さずメモリ上で完結させる）
+# python-pptxはエクスポートを実行するときに初めて読み込む
+import io
+from typing import Dict, Sequence
+
+PPTX_MIME = "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+
+# エクスポート時のグラフ形式
+EXPORT_NATIVE = "PowerPointグラフ（編集可能）"
+EXPORT_IMAGE = "画像"
+EXPORT_MODES = [EXPORT_NATIVE, EXPORT_IMAGE]
+
+# グラフ種別とpptx.enum.chart.XL_CHART_TYPEのメンバー名
+CHART_TYPES = {
+    "bar": "COLUMN_CLUSTERED",
+    "line": "LINE_MARKERS",
+    "pie": "PIE",
+}
+
+
+def add_picture_slide(ppt, title: str, png: bytes):
+    """タイトルとグラフ画像（PNGのバイト列）のスライドを追加"""
+    from pptx.util import Inches
+
+    slide = ppt.slides.add_slide(ppt.slide_layouts[5])
+    slide.shapes.title.text = title
+    slide.shapes.add_picture(io.BytesIO(png), Inches(1), Inches(1.5), width=Inches(6))
+    return slide
+
+
+def add_chart_slide(ppt, title: str, kind: str, categories: Sequence[str],
+                    series: Dict[str, Sequence[float]], number_format: str = "#,##0"):
+    """集計済みの系列からPowerPointのネイティブグラフ（棒・折れ線・円）のスライドを追加"""
+    from pptx.chart.data import CategoryChartData
+    from pptx.enum.chart import XL_CHART_TYPE, XL_LEGEND_POSITION
+    from pptx.util import Inches
+
+    slide = ppt.slides.add_slide(ppt.slide_layouts[5])
+    slide.shapes.title.text = title
+
+    chart_data = CategoryChartData(number_format=number_format)
+    chart_data.categories = list(categories)
+    for name, values in series.items():
+        chart_data.add_series(name, [float(v) for v in values])
+
+    graphic_frame = slide.shapes.add_chart(
+        getattr(XL_CHART_TYPE, CHART_TYPES[kind]), Inches(1), Inches(1.5), Inches(8), Inches(5.5), chart_data
+    )
+    chart = graphic_frame.chart
+    plot = chart.plots[0]
+    plot.has_data_labels = True
+    if kind == "pie":
+        plot.data_labels.number_format = "0.0%"
+        plot.data_labels.number_format_is_linked = False
+        plot.data_labels.show_percentage = True
+        plot.data_labels.show_value = False
+        chart.has_legend = True
+        chart.legend.position = XL_LEGEND_POSITION.RIGHT
+        chart.legend.include_in_layout = False
+    else:
+        plot.data_labels.number_format = number_format
+        plot.data_labels.number_format_is_linked = False
+        chart.has_legend = len(series) > 1
+    return slide
+
+
+def add_caption(slide, text: str):
+    """グラフ画像の下にテキストを追加"""
+    from pptx.util import Inches
+
+    slide.shapes.add_textbox(Inches(1), Inches(4.5), Inches(6), Inches(1)).text = text
+
+
+def add_text_slide(ppt, title: str, text: str):
+    """タイトルとテキストのスライドを追加"""
+    from pptx.util import Inches
+
+    slide = ppt.slides.add_slide(ppt.slide_layouts[5])
+    slide.shapes.title.text = title
+    textbox = slide.shapes.add_textbox(Inches(1), Inches(2), Inches(8), Inches(2))
+    textbox.text = text
+    return slide
+
+
+def new_presentation():
+    from pptx import Presentation
+
+    return Presentation()
+
+
+def presentation_to_bytes(ppt) -> bytes:
+    """PowerPointをファイルに保存せずバイト列として返す"""
+    buffer = io.BytesIO()
+    ppt.save(buffer)
+    return buffer.getvalue()
+
+
+def add_slides(ppt, slides: Sequence[dict]) -> None:
+    """スライド定義（辞書）のリストをPowerPointに追加
+
+    typeが"chart"ならadd_chart_slide、"picture"ならadd_picture_slide、
+    "text"ならadd_text_slideの引数をそのまま持つ。
+    """
+    for spec in slides:
+        spec = dict(spec)
+        slide_type = spec.pop("type")
+        if slide_type == "chart":
+            add_chart_slide(ppt, **spec)
+        elif slide_type == "picture":
+            caption = spec.pop("caption", None)
+            slide = add_picture_slide(ppt, **spec)
+            if caption:
+                add_caption(slide, caption)
+        elif slide_type == "text":
+            add_text_slide(ppt, **spec)
+        else:
+            raise ValueError(f"不明なスライド種別: {slide_type}")
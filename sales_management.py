@@ -1,170 +1,236 @@
 import streamlit as st
 import pandas as pd
-import math
-import os
-import matplotlib.pyplot as plt
 from database import Database
-from pptx import Presentation
-from pptx.util import Inches
+from money import THOUSAND_YEN, to_yen, from_yen
+from bulk_import import bulk_import_form
+from frames import CATEGORY, DATE, INTEGER, frame_from_rows
+from instrumentation import stage
+from queries import (
+    SALES_PAGE_SIZE, UNTAGGED, sales_total, sales_by_month, sales_by_tag, target_revenue as get_target_revenue,
+    has_sales, sales_page, search_sales
+)
+from charts import sales_bar_chart, sales_line_chart, sales_pie_chart
+from reports import (
+    PPTX_MIME, EXPORT_MODES, EXPORT_NATIVE,
+    new_presentation, add_picture_slide, add_chart_slide, add_text_slide, presentation_to_bytes
+)
+
+def generate_sales_pptx(bar_chart, line_chart, pie_chart, total_sales, sales_difference):
+    """PowerPointファイルを生成（バイト列で返す）"""
+    ppt = new_presentation()
 
-# 出力ディレクトリを設定
-output_dir = os.path.abspath("output_images")
-os.makedirs(output_dir, exist_ok=True)
+    # スライド1: 棒グラフ
+    add_picture_slide(ppt, "目標売上と総売上の比較", bar_chart)
+
+    # スライド2: 折れ線グラフ
+    add_picture_slide(ppt, "月別総売上", line_chart)
+
+    # スライド3: 円グラフ
+    add_picture_slide(ppt, "タグごとの売上割合", pie_chart)
 
-def save_matplotlib_chart(fig, filename):
-    """Matplotlibのグラフを画像として保存"""
-    filepath = os.path.join(output_dir, filename)
-    fig.savefig(filepath, format="png", dpi=300, bbox_inches="tight")
-    plt.close(fig)
-    return filepath
+    # スライド4: 総売上と目標差分
+    add_text_slide(
+        ppt, "総売上と目標差分",
+        f"総売上: {total_sales:,} 千円\n目標との差分: {sales_difference:+,} 千円"
+    )
+
+    return presentation_to_bytes(ppt)
 
-def generate_sales_pptx(bar_chart_path, line_chart_path, pie_chart_path, total_sales, sales_difference):
-    """PowerPointファイルを生成"""
-    ppt = Presentation()
+def generate_sales_native_pptx(target_revenue, total_sales, sales_difference, monthly_sales, tag_sales):
+    """PowerPointのネイティブグラフでファイルを生成（Matplotlibを使わない、バイト列で返す）"""
+    ppt = new_presentation()
 
     # スライド1: 棒グラフ
-    slide = ppt.slides.add_slide(ppt.slide_layouts[5])
-    slide.shapes.title.text = "目標売上と総売上の比較"
-    slide.shapes.add_picture(bar_chart_path, Inches(1), Inches(1.5), width=Inches(6))
+    add_chart_slide(ppt, "目標売上と総売上の比較", "bar", ["目標売上", "総売上"],
+                    {"売上高（千円）": [target_revenue, total_sales]})
 
     # スライド2: 折れ線グラフ
-    slide = ppt.slides.add_slide(ppt.slide_layouts[5])
-    slide.shapes.title.text = "月別総売上"
-    slide.shapes.add_picture(line_chart_path, Inches(1), Inches(1.5), width=Inches(6))
+    add_chart_slide(ppt, "月別総売上", "line", [r[0] for r in monthly_sales],
+                    {"売上高（千円）": [r[1] for r in monthly_sales]})
 
-    # スライド3: 円グラフ
-    slide = ppt.slides.add_slide(ppt.slide_layouts[5])
-    slide.shapes.title.text = "タグごとの売上割合"
-    slide.shapes.add_picture(pie_chart_path, Inches(1), Inches(1.5), width=Inches(6))
+    # スライド3: 円グラフ（売上がなければ割合を描けないため文字だけのスライドにする）
+    if any(r[1] for r in tag_sales):
+        add_chart_slide(ppt, "タグごとの売上割合", "pie", [r[0] for r in tag_sales],
+                        {"売上高（千円）": [r[1] for r in tag_sales]})
+    else:
+        add_text_slide(ppt, "タグごとの売上割合", "まだデータが登録されていません。")
 
     # スライド4: 総売上と目標差分
-    slide = ppt.slides.add_slide(ppt.slide_layouts[5])
-    slide.shapes.title.text = "総売上と目標差分"
-    textbox = slide.shapes.add_textbox(Inches(1), Inches(2), Inches(8), Inches(2))
-    textbox.text = f"総売上: {total_sales:,} 千円\n目標との差分: {sales_difference:+,} 千円"
-
-    pptx_file = os.path.join(output_dir, "sales_report.pptx")
-    ppt.save(pptx_file)
-    return pptx_file
+    add_text_slide(
+        ppt, "総売上と目標差分",
+        f"総売上: {total_sales:,} 千円\n目標との差分: {sales_difference:+,} 千円"
+    )
+
+    return presentation_to_bytes(ppt)
+
+def sales_grid(owner, period, tags):
+    """売上データ一覧（キーセットページング、並び替え・絞り込みはSQL側で行う。tagsはタグのid→タグ名）"""
+    st.subheader("売上データ一覧")
+    col1, col2, col3 = st.columns([3, 2, 2])
+    project_filter = col1.text_input("案件名で絞り込み（前方一致）", key="sales_grid_project")
+    tag_filter = col2.selectbox(
+        "タグで絞り込み", options=[None] + list(tags), format_func=lambda t: "すべて" if t is None else tags[t],
+        key="sales_grid_tag"
+    )
+    order = col3.selectbox("並び順", options=["日付の新しい順", "日付の古い順"], key="sales_grid_order")
+    descending = order == "日付の新しい順"
+
+    # 条件が変わったら1ページ目に戻す（cursorsは各ページ先頭の直前の行の (日付, id)）
+    grid_filter = (period, project_filter, tag_filter, descending)
+    if st.session_state.get("sales_grid_filter") != grid_filter:
+        st.session_state["sales_grid_filter"] = grid_filter
+        st.session_state["sales_grid_cursors"] = [None]
+    cursors = st.session_state["sales_grid_cursors"]
+
+    rows = sales_page(
+        owner, period, cursors[-1], descending, project_filter,
+        tag_filter,
+        limit=SALES_PAGE_SIZE + 1
+    )
+    has_next = len(rows) > SALES_PAGE_SIZE
+    rows = rows[:SALES_PAGE_SIZE]
+
+    df = frame_from_rows(rows, [
+        ("ID", INTEGER), ("案件名", CATEGORY), ("タグ", CATEGORY), ("売上金額", INTEGER), ("日付", DATE)
+    ])
+    df["売上金額"] = from_yen(df["売上金額"], THOUSAND_YEN)
+    start = (len(cursors) - 1) * SALES_PAGE_SIZE + 1
+    df.insert(0, "番号", range(start, start + len(df)))
+    st.dataframe(
+        df[["番号", "案件名", "タグ", "売上金額", "日付"]], use_container_width=True, hide_index=True,
+        column_config={"日付": st.column_config.DateColumn(format="YYYY-MM-DD")}
+    )
+
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+    col_prev.button("前へ", disabled=len(cursors) == 1, on_click=cursors.pop, key="sales_grid_prev")
+    col_page.caption(f"{len(cursors)} ページ目")
+    if rows:
+        last = rows[-1]
+        col_next.button("次へ", disabled=not has_next, on_click=cursors.append,
+                        args=((last[4], last[0]),), key="sales_grid_next")
 
 def sales_management_page():
     st.header("売上管理")
-
-    # 登録済みタグを取得
-    tags_data = Database.fetch_data("SELECT tag_name FROM tags")
-    tags = [tag[0] for tag in tags_data]
+    owner = st.session_state["username"]
+    period = st.session_state["period"]
+
+    # 登録済みタグと売上の集計を、1つの読み取りトランザクションでまとめて取得（同じ時点のデータを読む）
+    with stage("sales", "aggregate"):
+        results = Database.fetch_batch({
+            "tags": lambda: Database.fetch_cached("SELECT id, tag_name FROM tags WHERE owner = ? ORDER BY id", (owner,)),
+            "has_sales": lambda: has_sales(owner, period),
+            "target": lambda: get_target_revenue(owner),
+            "total": lambda: sales_total(owner, period),
+            "monthly": lambda: sales_by_month(owner, period),
+            "by_tag": lambda: sales_by_tag(owner, period),
+        })
+    tags = dict(results["tags"])
 
     # 売上データ登録フォーム
     with st.form("sales_form"):
         project = st.text_input("案件名")
-        tag = st.selectbox("タグ", options=tags if tags else ["タグなし"])
+        tag_id = st.selectbox(
+            "タグ", options=list(tags) if tags else [None], format_func=lambda t: UNTAGGED if t is None else tags[t]
+        )
         revenue = st.number_input("売上金額（千円単位）", min_value=0, step=1)  # 千円単位で入力
         date = st.date_input("日付")
         if st.form_submit_button("登録"):
             Database.execute_query(
-                "INSERT INTO sales (project, tag, revenue, date) VALUES (?, ?, ?, ?)",
-                (project, tag, revenue, str(date))
+                "INSERT INTO sales (owner, project, tag_id, revenue, date) VALUES (?, ?, ?, ?, ?)",
+                (owner, project, tag_id, to_yen(revenue, THOUSAND_YEN), str(date))
             )
             st.success("売上データを登録しました！")
             st.experimental_rerun()
 
-    # 売上データ取得
-    data = Database.fetch_data("SELECT id, project, tag, revenue, date FROM sales")
-    df = pd.DataFrame(data, columns=["ID", "案件名", "タグ", "売上金額", "日付"])
-    df["売上金額"] = df["売上金額"].apply(math.floor)
-    df.insert(0, "番号", range(1, len(df) + 1))
-
-    if not df.empty:
-        st.subheader("売上データ一覧")
-        st.dataframe(df[["番号", "案件名", "タグ", "売上金額", "日付"]], use_container_width=True)
+    # CSV/Excelからの一括登録
+    bulk_import_form("sales")
 
-        # 目標売上の取得
-        target_revenue_data = Database.fetch_data("SELECT amount FROM target_revenue")
-        target_revenue = math.floor(target_revenue_data[0][0]) if target_revenue_data else 0
+    if results["has_sales"]:
+        with stage("sales", "grid"):
+            sales_grid(owner, period, tags)
 
-        # 総売上の計算
-        total_sales = df["売上金額"].sum()
+        # 目標売上・総売上・月別・タグ別の計算（SQLで円単位のまま集計し、千円単位に切り捨て）
+        target_revenue = from_yen(results["target"], THOUSAND_YEN)
+        total_sales = from_yen(results["total"], THOUSAND_YEN)
         sales_difference = total_sales - target_revenue
+        monthly_rows = results["monthly"]
+        monthly_sales = list(zip(
+            [r[0] for r in monthly_rows], from_yen([r[1] for r in monthly_rows], THOUSAND_YEN)
+        ))
+        tag_rows = results["by_tag"]
+        tag_sales = list(zip([r[0] for r in tag_rows], from_yen([r[1] for r in tag_rows], THOUSAND_YEN)))
 
         # メトリクス表示
         st.metric("目標売上", f"{target_revenue:,} 千円")
         st.metric("総売上", f"{total_sales:,} 千円")
         st.metric("目標との差分", f"{sales_difference:+,} 千円")
 
-        # データ編集と削除
+        # データ編集と削除（検索で対象を絞り込む）
         st.subheader("データ編集・削除")
+        search_term = st.text_input("案件名（前方一致）または日付（YYYY-MM-DD）で検索", key="sales_search")
+        with stage("sales", "search"):
+            candidates = search_sales(owner, period, search_term)
+        if search_term and not candidates:
+            st.info("該当するデータがありません。")
         selected_row = st.selectbox(
             "編集・削除するデータを選択",
-            options=df.to_dict(orient="records"),
-            format_func=lambda x: f"{x['案件名']} - {x['売上金額']}千円 - {x['日付']}"
+            options=candidates,
+            format_func=lambda x: f"{x[1]} - {from_yen(x[3], THOUSAND_YEN):,}千円 - {x[4]}"
         )
         if selected_row:
-            edit_project = st.text_input("新しい案件名", value=selected_row["案件名"], key="edit_project")
-            edit_revenue = st.number_input("新しい売上金額（千円単位）", value=selected_row["売上金額"], min_value=0, step=1, key="edit_revenue")
-            edit_date = st.date_input("新しい日付", value=pd.to_datetime(selected_row["日付"]), key="edit_date")
+            sale_id, sale_project, _, sale_revenue, sale_date = selected_row
+            edit_project = st.text_input("新しい案件名", value=sale_project, key="edit_project")
+            edit_revenue = st.number_input(
+                "新しい売上金額（千円単位）", value=from_yen(sale_revenue, THOUSAND_YEN), min_value=0, step=1,
+                key="edit_revenue"
+            )
+            edit_date = st.date_input("新しい日付", value=pd.to_datetime(sale_date), key="edit_date")
 
             if st.button("変更を保存"):
                 Database.execute_query(
-                    "UPDATE sales SET project = ?, revenue = ?, date = ? WHERE id = ?",
-                    (edit_project, edit_revenue, str(edit_date), selected_row["ID"])
+                    "UPDATE sales SET project = ?, revenue = ?, date = ? WHERE id = ? AND owner = ?",
+                    (edit_project, to_yen(edit_revenue, THOUSAND_YEN), str(edit_date), sale_id, owner)
                 )
                 st.success("データを更新しました！")
                 st.experimental_rerun()
 
             if st.button("データを削除"):
-                Database.execute_query("DELETE FROM sales WHERE id = ?", (selected_row["ID"],))
+                Database.execute_query("DELETE FROM sales WHERE id = ? AND owner = ?", (sale_id, owner))
                 st.success("データを削除しました！")
                 st.experimental_rerun()
 
         # グラフ作成
         st.subheader("売上データのグラフ")
-        df["月"] = pd.to_datetime(df["日付"]).dt.strftime("%Y-%m")
 
-        # 棒グラフ
-        fig_bar, ax_bar = plt.subplots(figsize=(8, 6))
-        comparison_data = {"項目": ["目標売上", "総売上"], "金額": [target_revenue, total_sales]}
-        pd.DataFrame(comparison_data).set_index("項目")["金額"].plot(
-            kind="bar", ax=ax_bar, color=["#FF7F50", "#4682B4"]
-        )
-        ax_bar.set_title("目標売上と総売上の比較", fontsize=20, fontweight="bold")
-        ax_bar.set_xlabel("項目", fontsize=14)
-        ax_bar.set_ylabel("売上高（千円）", fontsize=14)
-        for i, v in enumerate([target_revenue, total_sales]):
-            ax_bar.text(i, v + 500, f"{v:,} 千円", ha="center", fontsize=12)
-        bar_chart_path = save_matplotlib_chart(fig_bar, "bar_chart.png")
-        st.image(bar_chart_path, caption="目標売上と総売上の比較", use_container_width=True)
-
-        # 折れ線グラフ
-        fig_line, ax_line = plt.subplots(figsize=(8, 6))
-        monthly_sales = df.groupby("月")["売上金額"].sum()
-        ax_line.plot(monthly_sales.index, monthly_sales.values, marker="o", linestyle="-", color="#2E8B57")
-        ax_line.set_title("月別総売上", fontsize=20, fontweight="bold")
-        ax_line.set_xlabel("月次推移", fontsize=14)
-        ax_line.set_ylabel("売上高（千円）", fontsize=14)
-        for x, y in zip(monthly_sales.index, monthly_sales.values):
-            ax_line.text(x, y + 500, f"{y:,} 千円", fontsize=10, ha="center")
-        line_chart_path = save_matplotlib_chart(fig_line, "line_chart.png")
-        st.image(line_chart_path, caption="月別総売上", use_container_width=True)
-
-        # 円グラフ
-        fig_pie, ax_pie = plt.subplots(figsize=(6, 6))
-        tag_sales = df.groupby("タグ")["売上金額"].sum()
-        tag_sales.plot(
-            kind="pie", ax=ax_pie, autopct="%1.1f%%", startangle=90, colors=["#FF7F50", "#4682B4", "#32CD32"]
-        )
-        ax_pie.set_title("タグごとの売上割合", fontsize=20, fontweight="bold")
-        ax_pie.set_ylabel("")
-        pie_chart_path = save_matplotlib_chart(fig_pie, "pie_chart.png")
-        st.image(pie_chart_path, caption="タグごとの売上割合", use_container_width=True)
+        with stage("sales", "charts"):
+            # 棒グラフ（データが変わらなければ描画済みの画像を再利用）
+            bar_chart = sales_bar_chart(target_revenue, total_sales)
+
+            # 折れ線グラフ
+            line_chart = sales_line_chart([r[0] for r in monthly_sales], [r[1] for r in monthly_sales])
+
+            # 円グラフ
+            pie_chart = sales_pie_chart([r[0] for r in tag_sales], [r[1] for r in tag_sales])
+        st.image(bar_chart, caption="目標売上と総売上の比較", use_container_width=True)
+        st.image(line_chart, caption="月別総売上", use_container_width=True)
+        st.image(pie_chart, caption="タグごとの売上割合", use_container_width=True)
 
         # PowerPointエクスポート
         st.subheader("PowerPointエクスポート")
+        export_mode = st.radio("グラフ形式", EXPORT_MODES, horizontal=True, key="sales_export_mode")
         if st.button("PowerPointファイルをダウンロード"):
-            pptx_file = generate_sales_pptx(bar_chart_path, line_chart_path, pie_chart_path, total_sales, sales_difference)
-            with open(pptx_file, "rb") as file:
-                st.download_button(
-                    label="PowerPointをダウンロード",
-                    data=file,
-                    file_name="sales_report.pptx",
-                    mime="application/vnd.openxmlformats-officedocument.presentationml.presentation"
-                )
+            with stage("sales", "export"):
+                if export_mode == EXPORT_NATIVE:
+                    pptx_data = generate_sales_native_pptx(
+                        target_revenue, total_sales, sales_difference, monthly_sales, tag_sales
+                    )
+                else:
+                    pptx_data = generate_sales_pptx(bar_chart, line_chart, pie_chart, total_sales, sales_difference)
+            st.download_button(
+                label="PowerPointをダウンロード",
+                data=pptx_data,
+                file_name="sales_report.pptx",
+                mime=PPTX_MIME
+            )
+    else:
+        st.info("選択した期間の売上データがありません。")
@@ -1,25 +1,25 @@
 # sg_a_costs.py
 import streamlit as st
-import pandas as pd
 import altair as alt
 from database import Database
-from pptx import Presentation
-from pptx.util import Inches
+from money import to_yen
+from bulk_import import bulk_import_form
+from frames import CATEGORY, DATE, INTEGER, load_frame
+from instrumentation import stage
+from reports import PPTX_MIME, new_presentation, add_picture_slide, add_caption, presentation_to_bytes
 import io
 
-def generate_sg_a_costs_pptx(chart, total_cost):
-    """PowerPointファイルを生成"""
-    ppt = Presentation()
-    slide = ppt.slides.add_slide(ppt.slide_layouts[5])
-    slide.shapes.title.text = "販管費データ"
-    slide.shapes.add_picture(chart, Inches(1), Inches(1.5), width=Inches(6))
-    slide.shapes.add_textbox(Inches(1), Inches(4.5), Inches(6), Inches(1)).text = f"総販管費: {total_cost:,} 円"
-    pptx_file = "sg_a_costs_report.pptx"
-    ppt.save(pptx_file)
-    return pptx_file
+def generate_sg_a_costs_pptx(chart_png, total_cost):
+    """PowerPointファイルを生成（バイト列で返す）"""
+    ppt = new_presentation()
+    slide = add_picture_slide(ppt, "販管費データ", chart_png)
+    add_caption(slide, f"総販管費: {total_cost:,} 円")
+    return presentation_to_bytes(ppt)
 
 def sg_a_costs_page():
     st.header("販管費管理")
+    owner = st.session_state["username"]
+    period = st.session_state["period"]
 
     # 販管費データ登録フォーム
     with st.form("sg_a_costs_form"):
@@ -29,16 +29,23 @@ def sg_a_costs_page():
         submitted = st.form_submit_button("登録")
         if submitted:
             Database.execute_query(
-                "INSERT INTO sg_a_costs (category, amount, date) VALUES (?, ?, ?)",
-                (category, amount, str(date))
+                "INSERT INTO sg_a_costs (owner, category, amount, date) VALUES (?, ?, ?, ?)",
+                (owner, category, to_yen(amount), str(date))
             )
             st.success("販管費データを登録しました！")
 
+    # CSV/Excelからの一括登録
+    bulk_import_form("sg_a_costs")
+
     # 販管費データ表示
-    data = Database.fetch_data("SELECT category, amount, date FROM sg_a_costs")
-    df = pd.DataFrame(data, columns=["費目", "金額", "日付"])
+    with stage("sg_a_costs", "load"):
+        df = load_frame(
+            "SELECT category, amount, date FROM sg_a_costs WHERE owner = ? AND date BETWEEN ? AND ?",
+            (owner, period.start, period.end),
+            [("費目", CATEGORY), ("金額", INTEGER), ("日付", DATE)]
+        )
     if not df.empty:
-        st.dataframe(df)
+        st.dataframe(df, column_config={"日付": st.column_config.DateColumn(format="YYYY-MM-DD")})
 
         # 総販管費を計算
         total_cost = df["金額"].sum()
@@ -55,13 +62,13 @@ def sg_a_costs_page():
         # PowerPointエクスポート
         st.subheader("PowerPointエクスポート")
         if st.button("PowerPointファイルをダウンロード"):
-            chart_path = "sg_a_costs_chart.png"
-            chart.save(chart_path)
-            pptx_file = generate_sg_a_costs_pptx(chart_path, total_cost)
-            with open(pptx_file, "rb") as file:
-                st.download_button(
-                    label="PowerPointをダウンロード",
-                    data=file,
-                    file_name=pptx_file,
-                    mime="application/vnd.openxmlformats-officedocument.presentationml.presentation"
-                )
+            with stage("sg_a_costs", "export"):
+                chart_buffer = io.BytesIO()
+                chart.save(chart_buffer, format="png")
+                pptx_data = generate_sg_a_costs_pptx(chart_buffer.getvalue(), total_cost)
+            st.download_button(
+                label="PowerPointをダウンロード",
+                data=pptx_data,
+                file_name="sg_a_costs_report.pptx",
+                mime=PPTX_MIME
+            )
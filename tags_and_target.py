@@ -1,9 +1,11 @@
 # tags_and_target.py
 import streamlit as st
 from database import Database
+from money import THOUSAND_YEN, to_yen, from_yen
 
 def tags_and_target_page():
     st.header("タグと目標売上の登録")
+    owner = st.session_state["username"]
 
     # タグ登録フォーム
     st.subheader("タグ登録")
@@ -11,11 +13,11 @@ def tags_and_target_page():
         new_tag = st.text_input("新しいタグを登録")
         submitted_tag = st.form_submit_button("登録")
         if submitted_tag and new_tag:
-            Database.execute_query("INSERT INTO tags (tag_name) VALUES (?)", (new_tag,))
+            Database.execute_query("INSERT INTO tags (owner, tag_name) VALUES (?, ?)", (owner, new_tag))
             st.success(f"タグ '{new_tag}' を登録しました！")
 
     # 登録済みタグの表示と管理
-    tags_data = Database.fetch_data("SELECT id, tag_name FROM tags")
+    tags_data = Database.fetch_cached("SELECT id, tag_name FROM tags WHERE owner = ?", (owner,))
     if tags_data:
         st.subheader("登録済みタグ")
         for tag_id, tag_name in tags_data:
@@ -24,7 +26,7 @@ def tags_and_target_page():
 
             # タグ削除ボタン
             if col2.button("削除", key=f"delete_{tag_id}"):
-                Database.execute_query("DELETE FROM tags WHERE id = ?", (tag_id,))
+                Database.execute_query("DELETE FROM tags WHERE id = ? AND owner = ?", (tag_id, owner))
                 st.success(f"タグ '{tag_name}' を削除しました！")
                 st.experimental_rerun()
 
@@ -32,7 +34,9 @@ def tags_and_target_page():
             if col3.button("編集", key=f"edit_{tag_id}"):
                 new_name = st.text_input(f"タグ '{tag_name}' の新しい名前を入力", value=tag_name, key=f"edit_name_{tag_id}")
                 if st.button("変更を保存", key=f"save_{tag_id}"):
-                    Database.execute_query("UPDATE tags SET tag_name = ? WHERE id = ?", (new_name, tag_id))
+                    Database.execute_query(
+                        "UPDATE tags SET tag_name = ? WHERE id = ? AND owner = ?", (new_name, tag_id, owner)
+                    )
                     st.success(f"タグ '{tag_name}' を '{new_name}' に変更しました！")
                     st.experimental_rerun()
     else:
@@ -41,17 +45,21 @@ def tags_and_target_page():
     # 目標売上登録フォーム
     st.subheader("目標売上登録")
     with st.form("target_form"):
-        target_revenue = st.number_input("年間目標売上高（円）", min_value=0, step=1000)
+        # 売上管理ページと同じく千円単位で入力する
+        target_revenue = st.number_input("年間目標売上高（千円）", min_value=0, step=1000)
         submitted_target = st.form_submit_button("登録")
         if submitted_target:
-            Database.execute_query("DELETE FROM target_revenue")
-            Database.execute_query("INSERT INTO target_revenue (amount) VALUES (?)", (target_revenue,))
-            st.success(f"年間目標売上高を {target_revenue:,} 円に設定しました！")
+            Database.execute_query("DELETE FROM target_revenue WHERE owner = ?", (owner,))
+            Database.execute_query(
+                "INSERT INTO target_revenue (owner, amount) VALUES (?, ?)",
+                (owner, to_yen(target_revenue, THOUSAND_YEN))
+            )
+            st.success(f"年間目標売上高を {target_revenue:,} 千円に設定しました！")
 
     # 登録済み目標売上の表示
-    target_data = Database.fetch_data("SELECT amount FROM target_revenue")
+    target_data = Database.fetch_cached("SELECT amount FROM target_revenue WHERE owner = ?", (owner,))
     if target_data:
         st.subheader("登録済み目標売上")
-        st.write(f"{target_data[0][0]:,} 円")
+        st.write(f"{from_yen(target_data[0][0], THOUSAND_YEN):,} 千円")
     else:
         st.info("まだ目標売上が登録されていません。")